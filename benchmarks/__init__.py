@@ -0,0 +1,13 @@
+"""
+Benchmark suite for the `utils` hot paths.
+
+It includes:
+  - synthetic: seeded generators with the real shapes and dtypes
+  - cases: one timed case per hot path, with "small" and "full" presets
+  - runner: wall-clock / peak-memory measurement and JSON reports
+  - imports: the import-time budget of the lightweight `utils` entry points
+    (`python -m benchmarks.imports`, exit status 1 when over budget)
+
+Run `python -m benchmarks --help` from the repository root; everything is
+generated locally and runs on CPU only.
+"""
@@ -0,0 +1,51 @@
+# benchmarks/__main__.py
+"""
+Run the benchmark suite.
+
+    python -m benchmarks                          # all cases, small preset
+    python -m benchmarks --size full -o bench.json
+    python -m benchmarks -k stats. -k spectral --compare bench_main.json
+    python -m benchmarks --list
+"""
+
+import argparse
+import os
+import sys
+
+# offline, CPU-only: keep JAX off accelerators before anything imports it
+os.environ.setdefault("JAX_PLATFORMS", "cpu")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", choices=["small", "full"], default="small",
+                        help="input preset; 'full' uses the real array shapes")
+    parser.add_argument("-k", "--filter", action="append", default=[],
+                        help="glob or substring of case names (repeatable)")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("-w", "--warmup", type=int, default=1)
+    parser.add_argument("-o", "--output", default="bench_results.json",
+                        help="JSON report path")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="previous JSON report to compare against")
+    parser.add_argument("--list", action="store_true", help="list cases and exit")
+    args = parser.parse_args(argv)
+
+    from benchmarks.cases import CASES
+    from benchmarks import runner
+
+    names = runner.select(CASES, args.filter)
+    if args.list:
+        print("\n".join(names))
+        return 0
+    results = runner.run(CASES, names, args.size, args.repeat, args.warmup)
+    report = runner.write_report(args.output, results, args.size)
+    print(f"Wrote {args.output}")
+    if args.compare:
+        runner.compare(report, args.compare)
+    return int(any("error" in r for r in results))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,444 @@
+# benchmarks/cases.py
+"""
+cases.py
+
+Timed cases for the `utils` hot paths.
+
+Every case is registered with `@case(name)` and receives the size preset
+("small" for a quick check, "full" for the real array shapes). It builds
+its inputs outside the timed region and returns a zero-argument callable
+that runs the measured work once. On-disk inputs (zip archives, stores,
+cache entries) are written to temporary directories removed at exit.
+"""
+
+import atexit
+import contextlib
+import io
+import os
+import pickle
+import shutil
+import tempfile
+import zipfile
+
+import numpy as np
+
+from benchmarks import synthetic
+
+CASES = {}
+
+SIZES = {
+    "small": dict(n_stim=640, n_chan=96, n_bins=20, feat_dim=512, n_perm=2000, n_images=4,
+                  n_trials=4000, n_surrogates=500, n_categories=4, n_objects=4),
+    "full": dict(n_stim=3200, n_chan=96, n_bins=20, feat_dim=4096, n_perm=10_000, n_images=64,
+                 n_trials=20_000, n_surrogates=2000, n_categories=8, n_objects=8),
+}
+
+
+def case(name):
+    """Register a case factory under `name` (module.function)."""
+    def register(factory):
+        CASES[name] = factory
+        return factory
+    return register
+
+
+def _block(x):
+    """Wait for JAX results so their compute is inside the timed region."""
+    return np.asarray(x)
+
+
+def _tempdir(prefix):
+    """Scratch directory for on-disk inputs, removed when the process exits."""
+    path = tempfile.mkdtemp(prefix=prefix)
+    atexit.register(shutil.rmtree, path, ignore_errors=True)
+    return path
+
+
+def _npy_zip(s, compression=zipfile.ZIP_STORED, n_members=8):
+    """Zip of `n_members` spike-tensor .npy files, like the downloaded archives."""
+    path = os.path.join(_tempdir("archive_"), "sessions.zip")
+    with zipfile.ZipFile(path, "w", compression=compression) as zf:
+        for k in range(n_members):
+            with zf.open(f"sessions/session_{k}.npy", "w") as f:
+                np.save(f, synthetic.spike_tensor(s["n_stim"], s["n_chan"], s["n_bins"], seed=k))
+    return path
+
+
+def _signflip_chunk(task, arrays, rng):
+    """One block of sign-flip null means (Executor task; module level so it pickles)."""
+    _, count = task
+    x = arrays["x"]
+    return (2 * rng.integers(0, 2, (count, x.shape[0])) - 1) @ x / x.shape[0]
+
+
+# ---------------------------------------------------------------------------
+# analysis_utils
+# ---------------------------------------------------------------------------
+@case("analysis_utils.pairwise_euclidean_distance")
+def _pairwise_euclidean(s):
+    from utils.analysis_utils import get_upper_indices, pairwise_euclidean_distance
+    X = synthetic.dnn_features(s["n_stim"] // 5, s["feat_dim"]).astype(np.float32)
+    iu, ju = get_upper_indices(X.shape[0])
+    return lambda: _block(pairwise_euclidean_distance(X, iu, ju))
+
+
+@case("analysis_utils.batched_rdms")
+def _batched_rdms(s):
+    from utils.analysis_utils import batched_rdms
+    data = synthetic.spike_tensor(s["n_stim"], s["n_chan"], s["n_bins"])
+    batches = np.random.default_rng(0).permutation(s["n_stim"]).reshape(-1, 16)
+    return lambda: batched_rdms(data, batches)
+
+
+@case("analysis_utils.rank_data_batch")
+def _rank_data_batch(s):
+    from utils.analysis_utils import rank_data_batch
+    arr = np.random.default_rng(0).random((120, s["n_stim"] // 16 * s["n_bins"]))
+    return lambda: rank_data_batch(arr, 64)
+
+
+@case("analysis_utils.robust_rdm")
+def _robust_rdm(s):
+    from utils.analysis_utils import robust_rdm
+    feats = [synthetic.dnn_features(s["n_stim"] // 5, s["feat_dim"], seed=k).astype(np.float32)
+             for k in range(3)]
+    return lambda: robust_rdm(feats)
+
+
+@case("rdm_bank.robust_rdm")
+def _bank_robust_rdm(s):
+    from utils.rdm_bank import RDMBank
+    bank = RDMBank(_tempdir("rdm_bank_"))
+    for k in range(3):
+        bank.build(f"net{k}", synthetic.dnn_features(s["n_stim"] // 5, s["feat_dim"], seed=k))
+    idx = np.random.default_rng(0).choice(s["n_stim"] // 5, 40, replace=False)
+    return lambda: bank.robust_rdm(idx=idx)
+
+
+@case("analysis_utils.perm_signflip_onesample")
+def _signflip(s):
+    from utils.analysis_utils import perm_signflip_onesample
+    vec = np.random.default_rng(0).normal(0.1, 1.0, 200)
+    return lambda: perm_signflip_onesample(vec, s["n_perm"], rng=np.random.default_rng(1))
+
+
+@case("analysis_utils.perm_diff_independent")
+def _diff_independent(s):
+    from utils.analysis_utils import perm_diff_independent
+    rng = np.random.default_rng(0)
+    x, y = rng.normal(0.2, 1, 60), rng.normal(0, 1, 60)
+    return lambda: perm_diff_independent(x, y, s["n_perm"], rng=np.random.default_rng(1))
+
+
+@case("analysis_utils.mantel_rsa")
+def _mantel(s):
+    from scipy.spatial.distance import pdist
+    from utils.analysis_utils import mantel_rsa
+    rng = np.random.default_rng(0)
+    a, b = pdist(rng.random((64, 50))), pdist(rng.random((64, 50)))
+    return lambda: mantel_rsa(a, b, s["n_perm"], rng=np.random.default_rng(1))
+
+
+@case("analysis_utils.crosstemporal_rsa")
+def _crosstemporal(s):
+    from utils.analysis_utils import crosstemporal_rsa
+    odd, even = synthetic.odd_even_split(s["n_stim"], s["n_chan"], s["n_bins"])
+    batches = np.random.default_rng(0).permutation(s["n_stim"]).reshape(-1, 16)
+    return lambda: crosstemporal_rsa(odd, even, batches, np.random.default_rng(1),
+                                     n_surrogates=s["n_surrogates"])
+
+
+@case("analysis_utils.round_robin_schedule")
+def _round_robin(s):
+    from utils.analysis_utils import round_robin_schedule, round_batches
+    return lambda: round_batches(round_robin_schedule(s["n_stim"], np.random.default_rng(0), 10))
+
+
+for _w in (1, 2):
+    @case(f"analysis_utils.crosstemporal_rsa_runs_w{_w}")
+    def _crosstemporal_runs(s, workers=_w):
+        from utils.analysis_utils import crosstemporal_rsa_runs, round_robin_schedule, round_batches
+        from utils.executor import task_seeds
+        odd, even = synthetic.odd_even_split(s["n_stim"], s["n_chan"], s["n_bins"])
+        runs = round_batches(round_robin_schedule(s["n_stim"], np.random.default_rng(0), 4))
+        return lambda: crosstemporal_rsa_runs(odd, even, runs, task_seeds(len(runs), 1),
+                                              n_surrogates=s["n_surrogates"], workers=workers)
+
+
+@case("rdm_bank.build")
+def _bank_build(s):
+    from utils.rdm_bank import RDMBank
+    bank = RDMBank(_tempdir("rdm_bank_"))
+    X = synthetic.dnn_features(s["n_stim"], s["feat_dim"])
+    return lambda: bank.build("net", X, force=True)
+
+
+@case("rdm_bank.subset")
+def _bank_subset(s):
+    from utils.rdm_bank import RDMBank
+    bank = RDMBank(_tempdir("rdm_bank_"))
+    bank.build("net", synthetic.dnn_features(s["n_stim"], s["feat_dim"]))
+    idx = np.random.default_rng(0).choice(s["n_stim"], s["n_stim"] // 2, replace=False)
+    return lambda: bank.subset("net", idx)
+
+
+# ---------------------------------------------------------------------------
+# executor / cache
+# ---------------------------------------------------------------------------
+for _w in (1, 2):
+    @case(f"executor.reduce_w{_w}")
+    def _reduce(s, workers=_w):
+        from utils.executor import Executor, NullMerge, chunks
+        x = np.random.default_rng(0).normal(0.1, 1.0, s["n_stim"])
+        obs = x.mean()
+
+        def run():
+            with Executor({"x": x}, workers=workers) as ex:
+                return ex.reduce(_signflip_chunk, chunks(s["n_perm"], 1000), NullMerge.add,
+                                 NullMerge(obs), seed=1).p_value
+        return run
+
+
+@case("cache.DiskCache_hit")
+def _cache_hit(s):
+    from utils.analysis_utils import batched_rdms
+    from utils.cache import DiskCache
+    cached = DiskCache(_tempdir("cache_"), max_bytes=None).memoize(batched_rdms)
+    data = synthetic.spike_tensor(s["n_stim"], s["n_chan"], s["n_bins"])
+    batches = np.random.default_rng(0).permutation(s["n_stim"]).reshape(-1, 16)
+    cached(data, batches)
+    return lambda: cached(data, batches)
+
+
+@case("cache.DiskCache_miss")
+def _cache_miss(s):
+    from utils.analysis_utils import batched_rdms
+    from utils.cache import DiskCache
+    cached = DiskCache(_tempdir("cache_"), max_bytes=None).memoize(batched_rdms)
+    data = synthetic.spike_tensor(s["n_stim"], s["n_chan"], s["n_bins"])
+    batches = np.random.default_rng(0).permutation(s["n_stim"]).reshape(-1, 16)
+
+    def run():
+        cached.clear()
+        return cached(data, batches)
+    return run
+
+
+# ---------------------------------------------------------------------------
+# data stores: zip archives, feature store, session store
+# ---------------------------------------------------------------------------
+@case("extract_and_download_data.Archive.load_npy")
+def _archive_load_npy(s):
+    from utils.extract_and_download_data import open_archive
+    archive = open_archive(_npy_zip(s))
+    names = archive.members("*.npy")
+    return lambda: [np.array(archive.load_npy(n)) for n in names]     # copy reads the pages
+
+
+@case("extract_and_download_data.Archive.load_npy_deflated")
+def _archive_load_npy_deflated(s):
+    from utils.extract_and_download_data import open_archive
+    archive = open_archive(_npy_zip(s, zipfile.ZIP_DEFLATED))
+    names = archive.members("*.npy")
+    return lambda: [archive.load_npy(n) for n in names]
+
+
+@case("extract_and_download_data.Archive.extract")
+def _archive_extract(s):
+    from utils.extract_and_download_data import open_archive
+    archive = open_archive(_npy_zip(s, zipfile.ZIP_DEFLATED))
+    root = _tempdir("extract_")
+    return lambda: archive.extract(tempfile.mkdtemp(dir=root))
+
+
+@case("extract_and_download_data.unzip_current")
+def _unzip_current(s):
+    from utils.extract_and_download_data import unzip
+    path = _npy_zip(s, zipfile.ZIP_DEFLATED)
+    target = _tempdir("extract_")
+    with contextlib.redirect_stdout(io.StringIO()):
+        unzip(path, target)
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            unzip(path, target)                      # every member already up to date
+    return run
+
+
+@case("feature_store.FeatureArray.take")
+def _feature_take(s):
+    from utils.feature_store import FeatureStore
+    root = _tempdir("features_")
+    names = [f"img_{i:05d}.png" for i in range(s["n_stim"])]
+    pkl = os.path.join(root, "net_features_high_variation_original.pkl")
+    with open(pkl, "wb") as f:
+        pickle.dump({"penultimate": synthetic.dnn_features(s["n_stim"], s["feat_dim"]),
+                     "image_names": names}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    store = FeatureStore(os.path.join(root, "store"))
+    fa = store.open(store.convert(pkl))
+    wanted = [f"img_{i:05d}" for i in np.random.default_rng(0).permutation(s["n_stim"])[::2]]
+    return lambda: fa.take(wanted, dtype=np.float64)
+
+
+@case("session_store.SessionStore.select")
+def _session_select(s):
+    from utils.session_store import SessionStore
+    store = SessionStore(_tempdir("sessions_"))
+    rng = np.random.default_rng(0)
+    n_sessions = 8
+    n_trials = s["n_trials"] // n_sessions
+    for k in range(n_sessions):
+        store.append_session(
+            f"2020{k + 1:02d}01",
+            {"spikes": synthetic.spike_tensor(n_trials, s["n_chan"], s["n_bins"], seed=k)},
+            {"stimId": rng.integers(0, s["n_stim"], n_trials),
+             "time_of_stimulus": np.sort(rng.uniform(0, 3600, n_trials))})
+    stim_ids = rng.choice(s["n_stim"], s["n_stim"] // 4, replace=False)
+    store.trial_index()                              # build the index outside timing
+    return lambda: store.select("spikes", stim_ids=stim_ids, bins=slice(0, s["n_bins"] // 2))
+
+
+# ---------------------------------------------------------------------------
+# stats
+# ---------------------------------------------------------------------------
+@case("stats.cluster_test_1d")
+def _cluster_1d(s):
+    from utils.stats import cluster_test
+    rng = np.random.default_rng(0)
+    z = rng.normal(size=s["n_bins"]) + np.r_[np.zeros(10), 3 * np.ones(s["n_bins"] - 10)]
+    return lambda: cluster_test(z, rng.normal(size=(s["n_perm"], s["n_bins"])))
+
+
+@case("stats.cluster_test_2d")
+def _cluster_2d(s):
+    from utils.stats import cluster_test
+    rng = np.random.default_rng(0)
+    T = s["n_bins"]
+    z_perm = rng.normal(size=(s["n_surrogates"], T, T))
+    return lambda: cluster_test(rng.normal(size=(T, T)) + 1.5, z_perm)
+
+
+@case("stats.stratified_permutations")
+def _stratified(s):
+    from utils.stats import stratified_permutations
+    labels = np.repeat(np.arange(s["n_categories"]), s["n_stim"] // s["n_categories"])
+    return lambda: sum(b.shape[0] for b in stratified_permutations(
+        labels, s["n_perm"], np.random.default_rng(0)))
+
+
+@case("stats.stratified_permutations_unequal")
+def _stratified_unequal(s):
+    from utils.stats import stratified_permutations
+    labels = np.random.default_rng(0).integers(0, 8 * s["n_categories"], s["n_stim"])
+    return lambda: sum(b.shape[0] for b in stratified_permutations(
+        labels, s["n_perm"], np.random.default_rng(0)))
+
+
+@case("stats.stratified_permutations_legacy")
+def _stratified_legacy(s):
+    from utils.stats import stratified_permutations
+    labels = np.random.default_rng(0).integers(0, 8 * s["n_categories"], s["n_stim"])
+    return lambda: sum(b.shape[0] for b in stratified_permutations(
+        labels, s["n_perm"], np.random.default_rng(0), legacy=True))
+
+
+# ---------------------------------------------------------------------------
+# preprocessing
+# ---------------------------------------------------------------------------
+@case("preprocessing.bin_spike_trains")
+def _bin_spikes(s):
+    from utils.preprocessing import flatten_spike_trains, bin_spike_trains
+    times, offsets = flatten_spike_trains(synthetic.spike_trains(s["n_chan"]))
+    onsets = synthetic.stimulus_onsets(s["n_stim"])
+    bin_spike_trains(times, offsets, onsets[:10])          # compile outside timing
+    return lambda: bin_spike_trains(times, offsets, onsets)
+
+
+# ---------------------------------------------------------------------------
+# image_processing / spectral
+# ---------------------------------------------------------------------------
+@case("image_processing.m_pathway_filter_gaussian")
+def _filter_single(s):
+    from utils.image_processing import m_pathway_filter_gaussian
+    img = synthetic.stimulus_images(1)[0]
+    return lambda: m_pathway_filter_gaussian(img)
+
+
+@case("image_processing.m_pathway_filter_gaussian_stack")
+def _filter_stack(s):
+    from utils.image_processing import m_pathway_filter_gaussian
+    imgs = synthetic.stimulus_images(s["n_images"])
+    return lambda: m_pathway_filter_gaussian(imgs)
+
+
+@case("spectral.filter_bank")
+def _filter_bank(s):
+    from utils.spectral import filter_bank
+    img = synthetic.stimulus_images(1)[0]
+    return lambda: filter_bank(img, [0.25, 0.5, 1.0, 2.0, 4.0])
+
+
+# ---------------------------------------------------------------------------
+# decoding / regression / prototype distance
+# ---------------------------------------------------------------------------
+def _neural_meta(s):
+    meta = synthetic.hvm_meta(s["n_categories"], s["n_objects"])
+    X = synthetic.spike_tensor(len(meta), s["n_chan"], 4).reshape(len(meta), -1).astype(np.float64)
+    return meta, X
+
+
+@case("decoding.decode_pair")
+def _decode_pair(s):
+    from utils.decoding import decode_pair
+    meta, X = _neural_meta(s)
+    labels, objects = meta["category_name"].values, meta["object_name"].values
+    return lambda: decode_pair("cat0", "cat1", X, labels, objects)
+
+
+@case("regression.loco_pca_regression")
+def _loco(s):
+    from utils.regression import predict_angles
+    meta = synthetic.hvm_meta(s["n_categories"], s["n_objects"])
+    X = synthetic.dnn_features(len(meta), s["feat_dim"]).astype(np.float32)
+    angle = np.arctan2(meta["centroid_x"] - 128, meta["centroid_y"] - 128).to_numpy()
+    return lambda: predict_angles(X, angle, meta["category_name"].values)
+
+
+@case("regression.circular_mae_null")
+def _mae_null(s):
+    from utils.regression import circular_mae_null
+    meta = synthetic.hvm_meta(s["n_categories"], s["n_objects"])
+    rng = np.random.default_rng(0)
+    true, pred = rng.uniform(-np.pi, np.pi, (2, len(meta)))
+    return lambda: circular_mae_null(pred, true, meta["category_name"].values, s["n_perm"],
+                                     np.random.default_rng(1))
+
+
+@case("prototype_distance.run")
+def _dp(s):
+    from utils.prototype_distance import PrototypeDistance
+    meta = synthetic.hvm_meta(s["n_categories"], s["n_objects"])
+    X = synthetic.dnn_features(len(meta), s["feat_dim"])
+    engine = PrototypeDistance(meta, s["n_perm"], np.random.default_rng(0))
+    return lambda: engine.run({"net": X})
+
+
+# ---------------------------------------------------------------------------
+# saccades
+# ---------------------------------------------------------------------------
+@case("saccades.saccade_table")
+def _saccade_table(s):
+    from utils.saccades import saccade_table
+    L, X, Y = synthetic.saccade_traces(s["n_trials"])
+    stim = np.random.default_rng(0).integers(0, s["n_stim"], s["n_trials"])
+    return lambda: saccade_table(L, X, Y, stim)
+
+
+@case("saccades.circular_bin_means")
+def _circular_means(s):
+    from utils.saccades import saccade_table, circular_bin_means
+    L, X, Y = synthetic.saccade_traces(s["n_trials"])
+    stim = np.random.default_rng(0).integers(0, s["n_stim"], s["n_trials"])
+    table = saccade_table(L, X, Y, stim)
+    edges = np.linspace(0.0, 0.2, s["n_bins"] + 1)
+    return lambda: circular_bin_means(table, s["n_stim"], edges)
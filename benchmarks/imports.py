@@ -0,0 +1,78 @@
+# benchmarks/imports.py
+"""
+imports.py
+
+Check of the `utils` import-time budget (`utils.lazy.IMPORT_BUDGET`).
+
+Each entry point is imported in a fresh interpreter; the best of `repeat`
+runs must fit its budget and none of `utils.lazy.HEAVY_MODULES` may be
+loaded. The command-line entry point is timed end to end.
+
+    python -m benchmarks.imports            # exit status 1 on a violation
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+dt = time.perf_counter() - t0
+heavy = sorted(m for m in {heavy!r} if m in sys.modules)
+print(json.dumps({{"seconds": dt, "heavy": heavy}}))
+"""
+
+
+def import_cost(module, heavy, repeat=3):
+    """Best import time of `module` in a fresh interpreter and the heavy modules it loaded."""
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", _PROBE.format(module=module, heavy=heavy)],
+                             capture_output=True, text=True, check=True, cwd=ROOT).stdout
+        res = json.loads(out.strip().splitlines()[-1])
+        if best is None or res["seconds"] < best["seconds"]:
+            best = res
+    return best
+
+
+def cli_cost(repeat=3):
+    """Best wall time of `python -m utils --help`."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "utils", "--help"], capture_output=True,
+                       check=True, cwd=ROOT)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def check(repeat=3, log=print):
+    """List of budget violations (empty when everything fits)."""
+    sys.path.insert(0, ROOT)
+    from utils.lazy import IMPORT_BUDGET, CLI_BUDGET, HEAVY_MODULES
+
+    failures = []
+    for module, budget in IMPORT_BUDGET.items():
+        res = import_cost(module, HEAVY_MODULES, repeat)
+        ok = res["seconds"] <= budget and not res["heavy"]
+        log(f"{'ok  ' if ok else 'FAIL'} import {module:<36s} {res['seconds'] * 1e3:8.1f} ms "
+            f"(budget {budget * 1e3:.0f} ms)" + (f"  loaded {', '.join(res['heavy'])}" if res["heavy"] else ""))
+        if not ok:
+            failures.append(module)
+    seconds = cli_cost(repeat)
+    ok = seconds <= CLI_BUDGET
+    log(f"{'ok  ' if ok else 'FAIL'} python -m utils --help {'':<20s} {seconds * 1e3:8.1f} ms "
+        f"(budget {CLI_BUDGET * 1e3:.0f} ms)")
+    if not ok:
+        failures.append("python -m utils")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(int(bool(check())))
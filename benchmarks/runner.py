@@ -0,0 +1,111 @@
+# benchmarks/runner.py
+"""
+runner.py
+
+Timing and peak-memory measurement of benchmark cases, and the
+machine-readable report that compares runs across commits.
+"""
+
+import fnmatch
+import gc
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+
+def environment():
+    """Commit, interpreter and library versions recorded with every report."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def measure(fn, repeat=5, warmup=1):
+    """
+    Wall-clock times of `repeat` calls (after `warmup` untimed calls) and the
+    peak traced allocation of one extra call.
+
+    Peak memory comes from tracemalloc, which sees NumPy buffers but not
+    allocations made inside JAX/XLA or BLAS workspaces.
+    """
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "times_s": times,
+        "min_s": min(times),
+        "median_s": float(np.median(times)),
+        "peak_bytes": int(peak),
+    }
+
+
+def select(cases, patterns):
+    """Case names matching any of the glob `patterns` (all when empty)."""
+    if not patterns:
+        return list(cases)
+    return [n for n in cases if any(fnmatch.fnmatch(n, p) or p in n for p in patterns)]
+
+
+def run(cases, names, size, repeat=5, warmup=1, log=print):
+    """Run the `names` cases at `size`; failures are recorded, not raised."""
+    from benchmarks.cases import SIZES
+
+    results = []
+    for name in names:
+        entry = {"case": name, "size": size}
+        try:
+            fn = cases[name](SIZES[size])
+            entry.update(measure(fn, repeat, warmup))
+            log(f"{name:<50s} {entry['median_s'] * 1e3:10.2f} ms  {entry['peak_bytes'] / 2**20:9.1f} MiB")
+        except Exception as exc:                       # keep going; report the failure
+            entry["error"] = f"{type(exc).__name__}: {exc}"
+            log(f"{name:<50s} FAILED {entry['error']}")
+        results.append(entry)
+    return results
+
+
+def write_report(path, results, size):
+    report = {"environment": environment(), "size": size, "results": results}
+    with open(path, "w") as f:
+        json.dump(report, f, indent=1)
+    return report
+
+
+def compare(report, baseline_path, log=print):
+    """Print median-time and peak-memory ratios against a previous report."""
+    with open(baseline_path) as f:
+        baseline = {r["case"]: r for r in json.load(f)["results"] if "error" not in r}
+    for r in report["results"]:
+        old = baseline.get(r["case"])
+        if old is None or "error" in r:
+            continue
+        log(f"{r['case']:<50s} time x{r['median_s'] / old['median_s']:6.2f}   "
+            f"memory x{r['peak_bytes'] / max(old['peak_bytes'], 1):6.2f}")
@@ -0,0 +1,114 @@
+# benchmarks/synthetic.py
+"""
+synthetic.py
+
+Seeded synthetic stand-ins for the project's data, with the real shapes
+and dtypes so the benchmarks exercise the same memory traffic offline.
+It includes:
+  - Trial-averaged spike tensors (3200 stimuli x 96 channels x 20 bins, int8)
+  - Raw spike trains (30 kHz samples) and stimulus onsets of one session
+  - fp16 DNN penultimate features (512–4096 dims)
+  - 256 x 256 grayscale stimuli
+  - HVM-like metadata (8 categories x 8 objects, low/high variation)
+  - U'n'Eye-like saccade labels with eye traces, and the event table
+"""
+
+import numpy as np
+import pandas as pd
+
+N_STIM = 3200
+N_CHAN = 96
+N_BINS = 20
+
+
+def spike_tensor(n_stim=N_STIM, n_chan=N_CHAN, n_bins=N_BINS, rate=1.5, seed=0):
+    """(n_stim, n_chan, n_bins) int8 Poisson spike counts."""
+    rng = np.random.default_rng(seed)
+    gain = rng.gamma(2.0, rate / 2.0, size=(1, n_chan, 1))
+    tuning = rng.lognormal(0.0, 0.3, size=(n_stim, n_chan, 1))
+    lam = gain * tuning * np.linspace(0.5, 1.5, n_bins)[None, None, :]
+    return np.minimum(rng.poisson(lam), 127).astype(np.int8)
+
+
+def odd_even_split(n_stim=N_STIM, n_chan=N_CHAN, n_bins=N_BINS, seed=0):
+    """Two noisy repeats of the same spike tensor (odd / even sessions)."""
+    base = spike_tensor(n_stim, n_chan, n_bins, seed=seed).astype(np.int16)
+    rng = np.random.default_rng(seed + 1)
+    odd = np.clip(base + rng.integers(-1, 2, base.shape), 0, 127).astype(np.int8)
+    even = np.clip(base + rng.integers(-1, 2, base.shape), 0, 127).astype(np.int8)
+    return odd, even
+
+
+def spike_trains(n_chan=N_CHAN, duration_s=600.0, rate_hz=20.0, fs=30_000, seed=0):
+    """Sorted per-channel spike times (in samples) of one session."""
+    rng = np.random.default_rng(seed)
+    n = rng.poisson(rate_hz * duration_s, size=n_chan)
+    return [np.sort(rng.uniform(0, duration_s * fs, size=k)) for k in n]
+
+
+def stimulus_onsets(n_trials=3000, duration_s=600.0, fs=30_000, seed=0):
+    """Sorted stimulus onsets (in samples) leaving room for a 200 ms window."""
+    rng = np.random.default_rng(seed)
+    return np.sort(rng.uniform(0, (duration_s - 0.2) * fs, size=n_trials))
+
+
+def dnn_features(n_images=N_STIM, dim=2048, seed=0):
+    """(n_images, dim) fp16 non-negative penultimate activations."""
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((n_images, dim), dtype=np.float32)
+    return np.maximum(X, 0).astype(np.float16)
+
+
+def stimulus_images(n_images=16, shape=(256, 256), seed=0):
+    """(n_images, rows, cols) uint8 grayscale images with 1/f-like structure."""
+    rng = np.random.default_rng(seed)
+    rows, cols = shape
+    fy = np.fft.fftfreq(rows)[:, None]
+    fx = np.fft.rfftfreq(cols)[None, :]
+    amp = 1.0 / np.maximum(np.sqrt(fx**2 + fy**2), 1.0 / max(rows, cols))
+    phase = rng.uniform(0, 2 * np.pi, size=(n_images, rows, cols // 2 + 1))
+    img = np.fft.irfft2(amp * np.exp(1j * phase), s=shape)
+    img -= img.min(axis=(1, 2), keepdims=True)
+    img /= img.max(axis=(1, 2), keepdims=True)
+    return (img * 255).astype(np.uint8)
+
+
+def hvm_meta(n_categories=8, n_objects=8, n_low=10, n_high=40, seed=0):
+    """
+    HVM-like metadata: per object `n_low` variation-0 and `n_high`
+    variation-3 images, with centroid positions.
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for c in range(n_categories):
+        for o in range(n_objects):
+            for variation, n in ((0, n_low), (3, n_high)):
+                rows += [(f"cat{c}", f"obj{c}_{o}", variation)] * n
+    meta = pd.DataFrame(rows, columns=["category_name", "object_name", "variation"])
+    meta["centroid_x"] = rng.uniform(0, 256, len(meta))
+    meta["centroid_y"] = rng.uniform(0, 256, len(meta))
+    meta["filename"] = [f"img_{i:05d}.png" for i in range(len(meta))]
+    return meta
+
+
+def saccade_traces(n_trials=20_000, n_time=125, p_onset=0.004, seed=0):
+    """
+    Binary saccade labels L and eye traces X, Y (deg) at 250 Hz.
+
+    Each labelled run lasts 4–12 samples; traces are clipped random walks
+    with a jump across every saccade.
+    """
+    rng = np.random.default_rng(seed)
+    onset = rng.random((n_trials, n_time)) < p_onset
+    length = rng.integers(4, 13, size=(n_trials, n_time))
+    L = np.zeros((n_trials, n_time), dtype=np.int8)
+    t, s = np.nonzero(onset)
+    for k in range(12):
+        keep = k < length[t, s]
+        cols = s[keep] + k
+        ok = cols < n_time
+        L[t[keep][ok], cols[ok]] = 1
+    jump = onset * rng.normal(0, 0.5, size=(2, n_trials, n_time))
+    drift = rng.normal(0, 0.01, size=(2, n_trials, n_time))
+    X, Y = np.clip(np.cumsum(jump + drift, axis=2), -10, 10).astype(np.float32)
+    return L, X, Y
@@ -1 +1,98 @@
+"""
+Analysis utilities for the vlPFC / ventral-stream notebooks.
 
+The package is loaded lazily: `import utils` imports no submodule, and
+`utils.<name>` imports only the submodule that defines `name` on first
+access. In the four budgeted entry-point modules below, heavy dependencies
+(jax, scipy, sklearn, cv2, matplotlib, seaborn, pandas, requests) are in
+turn imported inside the functions that need them, so entry points such as
+`download_files`, `unzip`, `training_kind` or `q_to_stars` start with numpy
+only. The other submodules import their dependencies at the top: scipy
+(stats, regression), pandas (cache, feature_store, session_store, saccades,
+prototype_distance), jax (kernels) and numba (preprocessing).
+
+Import-time budget (fresh interpreter, see `utils.lazy.IMPORT_BUDGET`,
+checked by `python -m benchmarks.imports`):
+  - `import utils`                                     < 0.05 s
+  - extract_and_download_data, analysis_utils,
+    image_processing, plotting_utils                   < 0.5 s each,
+    without loading any of the heavy modules above
+
+Command line: `python -m utils {download,unzip,filter} --help`.
+"""
+
+import importlib
+
+_SUBMODULES = (
+    "analysis_utils", "cache", "decoding", "executor", "extract_and_download_data", "feature_store",
+    "image_processing", "instrumentation", "kernels", "lazy", "moments", "plotting_utils",
+    "preprocessing", "prototype_distance", "rdm_bank", "regression", "saccades", "session_store",
+    "spectral", "stats",
+)
+
+_PUBLIC = {
+    "analysis_utils": (
+        "get_upper_indices", "pairwise_euclidean_distance", "batched_rdms", "spearman_corr_ranked",
+        "rank_along_axis", "rank_data", "rank_jaccard_rdm", "crosstemporal_rsa",
+        "crosstemporal_rsa_runs",
+        "pairwise_cosine_distances", "jaccard_distance", "robust_consensus", "robust_rdm",
+        "rank_data_batch", "condensed", "sqeucl", "training_kind", "iter_round_robin",
+        "round_robin_schedule", "round_batches", "round_robin_pairs", "pairs_to_batches",
+        "perm_signflip_onesample", "condensed_index_map", "mantel_rsa", "perm_diff_independent",
+        "zscore",
+    ),
+    "cache": ("DiskCache", "fingerprint", "memoize"),
+    "decoding": ("decode_pair", "SharedFeatures", "pair_matrices", "decode_all", "parallel_decoding"),
+    "extract_and_download_data": (
+        "calculate_md5", "DownloadManifest", "make_session", "download_figshare_file",
+        "download_files", "Archive", "open_archive", "is_in_zip", "unzip",
+    ),
+    "executor": ("SharedArrays", "Executor", "NullMerge", "task_seeds", "chunks"),
+    "feature_store": ("FeatureArray", "FeatureStore"),
+    "image_processing": (
+        "gaussian_transfer_function", "m_pathway_filter_gaussian", "to_uint8",
+        "radial_average_vectorized", "process_and_filter_images", "compute_radial_spectra",
+        "plot_radial_spectra",
+    ),
+    "instrumentation": ("timer", "timed", "print_report", "write_report"),
+    "moments": ("RunningStats",),
+    "plotting_utils": (
+        "q_to_stars", "clusters", "gaussian_patch", "plot_rotated_density_single",
+        "plot_rotated_density_dual",
+    ),
+    "preprocessing": ("flatten_spike_trains", "bin_spike_trains", "session_spike_counts"),
+    "prototype_distance": ("truncated_pca", "project", "PrototypeDistance"),
+    "rdm_bank": ("condensed_rdm", "subset_positions", "RDMBank"),
+    "regression": ("loco_pca_regression", "predict_angles", "circ_diff", "circular_mae_null"),
+    "saccades": (
+        "calculate_velocity", "find_saccades", "median_position", "saccade_table", "save_table",
+        "load_table", "to_frame", "from_frame", "circular_bin_means", "fill_circular",
+        "direction_locking", "direction_locking_null",
+    ),
+    "session_store": ("file_fingerprint", "SessionStore", "append_aligned_session"),
+    "spectral": (
+        "radial_bins", "radial_average", "log_radial_spectrum", "filter_bank",
+        "folder_radial_spectra", "cutoff_sweep",
+    ),
+    "stats": ("label_clusters", "cluster_masses", "max_cluster_mass", "cluster_test",
+              "stratified_permutations"),
+}
+
+_EXPORTS = {name: module for module, names in _PUBLIC.items() for name in names}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"{__name__}.{module}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_SUBMODULES) | set(_EXPORTS))
@@ -0,0 +1,89 @@
+# utils/__main__.py
+"""
+Data preparation from the command line.
+
+    python -m utils download "Stimuli.zip" "Neural_data.zip" --repo . --dest downloads
+    python -m utils unzip downloads/Stimuli.zip Stimuli --member "images/*"
+    python -m utils filter Stimuli/images Stimuli/images_lsf --cutoff 0.5 --fov 8
+
+Only the submodule a command needs is imported, after the arguments are
+parsed, so `--help` and argument errors return immediately.
+"""
+
+import argparse
+import os
+import sys
+
+
+def _download(args):
+    from utils.extract_and_download_data import download_files
+    results = download_files(args.repo, args.files, private_link=args.private_link,
+                             token=args.token, force_download=args.force,
+                             max_workers=args.workers, download_dir=args.dest)
+    if results is None:                                  # mapping file missing
+        return 1
+    missing = sorted(set(args.files) - set(results))
+    for name in missing:
+        print(f"Not listed in file_code_mapping.csv: {name}")
+    return int(bool(missing) or not all(results.values()))
+
+
+def _unzip(args):
+    from utils.extract_and_download_data import open_archive, unzip
+    members = None
+    if args.member and os.path.exists(args.zip):
+        archive = open_archive(args.zip)
+        members = sorted({n for pattern in args.member for n in archive.members(pattern)})
+    unzip(args.zip, args.dest, members=members, workers=args.workers)
+    return 0
+
+
+def _filter(args):
+    from functools import partial
+    from utils.image_processing import m_pathway_filter_gaussian, process_and_filter_images
+    filter_func = partial(m_pathway_filter_gaussian, cutoff_cpd=args.cutoff, fov_deg=args.fov,
+                          atten_dB_at_cut=args.atten_db)
+    process_and_filter_images(args.src, args.dest, filter_func=filter_func, workers=args.workers,
+                              chunk_size=args.chunk_size)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("download", help="download files listed in file_code_mapping.csv")
+    p.add_argument("files", nargs="+", help="file names as listed in the mapping")
+    p.add_argument("--repo", default=".", help="folder containing file_code_mapping.csv")
+    p.add_argument("--dest", default="downloads")
+    p.add_argument("--token", default=None, help="Figshare token for private access")
+    p.add_argument("--private-link", default=None)
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--force", action="store_true", help="re-download verified files")
+    p.set_defaults(func=_download)
+
+    p = sub.add_parser("unzip", help="extract missing or changed archive members")
+    p.add_argument("zip")
+    p.add_argument("dest")
+    p.add_argument("--member", action="append", default=[],
+                   help="member name or glob to extract (repeatable; default all)")
+    p.add_argument("--workers", type=int, default=4)
+    p.set_defaults(func=_unzip)
+
+    p = sub.add_parser("filter", help="Gaussian low-pass (m_pathway_filter_gaussian) a folder of images")
+    p.add_argument("src")
+    p.add_argument("dest")
+    p.add_argument("--cutoff", type=float, default=0.5, help="cut-off in cycles/degree")
+    p.add_argument("--fov", type=float, default=8.0, help="degrees spanned by the image")
+    p.add_argument("--atten-db", type=float, default=-20.0, help="attenuation at the cut-off")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--chunk-size", type=int, default=64)
+    p.set_defaults(func=_filter)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
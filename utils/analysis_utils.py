@@ -1,8 +1,9 @@
+import itertools
+import math
+
 import numpy as np
-from scipy.stats import rankdata as scipy_rankdata
-from scipy.spatial.distance import pdist
-import jax.numpy as jnp
-from jax import jit
+
+from utils.instrumentation import instrument_module
 
 rng_global = np.random.default_rng(42)
 
@@ -10,8 +11,39 @@ def get_upper_indices(n):
     return np.triu_indices(n, k=1)
 
 def pairwise_euclidean_distance(X, i_upper, j_upper):
-    diff = X[:, None, :] - X[None, :, :]
-    return jnp.sum(diff**2, axis=-1)[i_upper, j_upper]
+    """
+    Condensed squared distances from explicit differences, through the
+    shape-bucketed kernel registry (no retracing per shape).
+    """
+    from utils import kernels
+    return kernels.pairwise_sqeuclidean(X, i_upper, j_upper, method="diff")
+
+def batched_rdms(data, batch_idx, dtype=np.float32):
+    """
+    Condensed squared-Euclidean RDMs of every batch and time bin in one pass.
+
+    data      : (N_stim, n_chan, T) or (N_stim, n_feat)
+    batch_idx : (n_batches, batch_size) integer indices into the stimuli
+    dtype     : float32 or float64 accumulation type
+
+    Returns (n_batches, n_pairs, T), or (n_batches, n_pairs) for 2-D data.
+    Distances come from ||x||² + ||y||² - 2 x·y, so integer spike counts
+    stay exact in float32 as long as the Gram entries are below 2**24.
+    """
+    data, batch_idx = np.asarray(data), np.asarray(batch_idx)
+    if batch_idx.ndim != 2:
+        raise ValueError("batch_idx must be a 2-D (n_batches, batch_size) array")
+    squeeze = data.ndim == 2
+    if squeeze:
+        data = data[..., None]
+    X = np.moveaxis(data[batch_idx].astype(dtype, copy=False), -1, 1)  # (B, T, b, C)
+    sq = np.einsum("btic,btic->bti", X, X)
+    gram = X @ np.swapaxes(X, -1, -2)
+    iu, ju = get_upper_indices(batch_idx.shape[1])
+    d = sq[..., iu] + sq[..., ju] - 2 * gram[..., iu, ju]
+    np.maximum(d, 0, out=d)
+    d = np.ascontiguousarray(np.swapaxes(d, 1, 2))
+    return d[..., 0] if squeeze else d
 
 def spearman_corr_ranked(x, y):
     x_mean = x.mean()
@@ -20,28 +52,141 @@ def spearman_corr_ranked(x, y):
     den = np.sqrt(((x - x_mean)**2).sum() * ((y - y_mean)**2).sum())
     return float(num / den)
 
+# argsort indices + sorted copy + tie bounds + output, per ranked element
+_RANK_BYTES_PER_ELEM = 40
+# mantel_rsa working set per permutation and stimulus pair: two int32
+# label gathers, the int32 position and the float64 gathered rank
+_MANTEL_BYTES_PER_PAIR = 20
+
+def _rank_lastaxis(a):
+    a, n = np.ascontiguousarray(a), a.shape[-1]
+    order = np.argsort(a, axis=-1, kind="stable")
+    srt = np.take_along_axis(a, order, axis=-1)
+    pos = np.broadcast_to(np.arange(n), a.shape)
+    new = np.ones(a.shape, bool)
+    new[..., 1:] = srt[..., 1:] != srt[..., :-1]
+    last = np.ones(a.shape, bool)
+    last[..., :-1] = new[..., 1:]
+    start = np.maximum.accumulate(np.where(new, pos, 0), axis=-1)
+    end = np.flip(np.minimum.accumulate(np.flip(np.where(last, pos, n - 1), -1), axis=-1), -1)
+    out = np.empty(a.shape, np.float64)
+    np.put_along_axis(out, order, (start + end) / 2.0 + 1.0, axis=-1)
+    if np.issubdtype(a.dtype, np.floating):
+        out[np.isnan(a).any(axis=-1)] = np.nan
+    return out
+
+def rank_along_axis(arr, axis=0, max_bytes=None):
+    """
+    Tie-aware (average) ranks along `axis` of a 1-D/2-D/3-D array.
+
+    All lanes are ranked in one sort-based pass, matching
+    scipy.stats.rankdata(arr, axis=axis) including NaN propagation.
+    With `max_bytes`, lanes are processed in chunks so the working
+    memory stays below roughly that many bytes.
+    """
+    a = np.moveaxis(np.asarray(arr), axis, -1)
+    if a.shape[-1] == 0 or a.size == 0:
+        return np.moveaxis(np.empty(a.shape, np.float64), -1, axis)
+    if max_bytes is None:
+        return np.moveaxis(_rank_lastaxis(a), -1, axis)
+    lead, n = a.shape[:-1], a.shape[-1]
+    flat = a.reshape(-1, n)
+    lanes = max(1, int(max_bytes) // (n * _RANK_BYTES_PER_ELEM))
+    out = np.empty(flat.shape, np.float64)
+    for i in range(0, flat.shape[0], lanes):
+        out[i:i + lanes] = _rank_lastaxis(flat[i:i + lanes])
+    return np.moveaxis(out.reshape(*lead, n), -1, axis)
+
 def rank_data(arr):
-    try:
-        return scipy_rankdata(arr, axis=0)
-    except Exception:
-        return np.vstack([scipy_rankdata(arr[:, i]) for i in range(arr.shape[1])]).T
+    return rank_along_axis(arr, axis=0)
 
 def rank_jaccard_rdm(x):
-    x = np.asarray(x)
-    if x.ndim == 1:
-        x = x[:, None]
-    N, M = x.shape
-    out = np.empty_like(x, dtype=float)
-    for j in range(M):
-        col = x[:, j]
-        n0 = np.count_nonzero(col == 0)
-        if n0 == 0 or n0 == N:
-            out[:, j] = (N + 1) / 2.0
-        else:
-            r0 = (n0 + 1) / 2.0
-            r1 = (n0 + 1 + N) / 2.0
-            out[:, j] = np.where(col == 0, r0, r1)
-    return out.squeeze()
+    return rank_along_axis(x, axis=0).squeeze()
+
+def _standardize_columns(r):
+    r = r - r.mean(axis=-2, keepdims=True)
+    return r / np.sqrt((r**2).sum(axis=-2, keepdims=True))
+
+def crosstemporal_rsa(odd, even, batches, rng, n_surrogates=2000, dtype=np.float32):
+    """
+    Odd/even time-course and cross-temporal RSA over all batches of one run.
+
+    odd, even : (N_stim, n_chan, T) spike counts of the two session splits
+    batches   : (n_batches, batch_size) stimulus indices (e.g. one round)
+    rng       : np.random.Generator, drawn in the notebooks' order:
+                `timecourse_once` (one within-batch relabelling per batch,
+                then the surrogate sign flips) followed by `crosstemp_once`
+                (its own relabelling, then the surrogate coins), so a run
+                seeded like the notebooks' `rng_local` reproduces both
+
+    Ranked RDMs of every batch are z-scored per time bin so all T x T
+    Spearman blocks (actual and label-permuted null) come from one batched
+    matrix product. Surrogates are built for all draws at once as
+    sign- or coin-weighted sums of the per-batch actual/null blocks.
+
+    Returns
+    -------
+    mean_r  : (T,) mean diagonal correlation across batches
+    surr_r  : (n_surrogates, T) sign-flipped (actual - null) diagonals
+    mean_ct : (T, T) symmetrised mean cross-temporal correlation
+    surr_ct : (n_surrogates, T, T) symmetrised coin-mixed surrogates
+    """
+    batches = np.asarray(batches)
+    n_batches = batches.shape[0]
+
+    def ranked(d, b):
+        return _standardize_columns(rank_along_axis(batched_rdms(d, b, dtype=dtype), axis=1))
+
+    zo, ze = ranked(odd, batches), ranked(even, batches)
+    actual = np.swapaxes(zo, 1, 2) @ ze                 # (B, T, T)
+    real = np.diagonal(actual, axis1=1, axis2=2)       # (B, T)
+    T = actual.shape[-1]
+
+    # time course: relabelling and sign flips
+    zop = ranked(odd, rng.permuted(batches, axis=1))
+    diff = real - np.einsum("bpt,bpt->bt", zop, ze)
+    signs = 2 * rng.integers(0, 2, size=(n_surrogates, n_batches)) - 1
+    surr_r = signs @ diff / n_batches
+
+    # cross-temporal: a fresh relabelling and coins
+    zop = ranked(odd, rng.permuted(batches, axis=1))
+    null = np.swapaxes(zop, 1, 2) @ ze
+    mean_ct = actual.mean(axis=0)
+    mean_ct = 0.5 * (mean_ct + mean_ct.T)
+    coin = rng.integers(0, 2, size=(n_surrogates, n_batches)) == 0
+    surr_ct = (null.mean(axis=0).ravel()
+               + coin @ (actual - null).reshape(n_batches, -1) / n_batches)
+    surr_ct = surr_ct.reshape(n_surrogates, T, T)
+    surr_ct = 0.5 * (surr_ct + np.swapaxes(surr_ct, 1, 2))
+    return real.mean(axis=0), surr_r, mean_ct, surr_ct
+
+def _crosstemporal_task(r, arrays, rng):
+    return crosstemporal_rsa(arrays["odd"], arrays["even"], arrays["runs_batches"][r], rng,
+                             arrays["n_surrogates"], arrays["dtype"])
+
+def crosstemporal_rsa_runs(odd, even, runs_batches, seeds, n_surrogates=2000, dtype=np.float32,
+                           workers=None):
+    """
+    `crosstemporal_rsa` of every run on a process pool (utils.executor).
+
+    runs_batches : (n_runs, n_batches, batch_size), e.g.
+                   round_batches(round_robin_schedule(n_stim, rng_global, n_runs))
+    seeds        : one seed per run; `task_seeds(n_runs, legacy_rng=rng_global)`
+                   reproduces the notebooks' `default_rng(rng_global.integers(2**32))`
+                   loop, `task_seeds(n_runs, seed)` gives SeedSequence streams
+
+    odd/even go to shared memory once. Results do not depend on `workers`
+    and are stacked over runs: (n_runs, T), (n_runs, n_surrogates, T),
+    (n_runs, T, T), (n_runs, n_surrogates, T, T).
+    """
+    from utils.executor import Executor
+
+    runs_batches = np.asarray(runs_batches)
+    arrays = {"odd": odd, "even": even, "runs_batches": runs_batches}
+    consts = {"n_surrogates": n_surrogates, "dtype": dtype}
+    with Executor(arrays, consts, workers=workers) as ex:
+        results = ex.map(_crosstemporal_task, range(len(runs_batches)), seeds=seeds)
+    return tuple(np.stack(parts) for parts in zip(*results))
 
 def pairwise_cosine_distances(X):
     X_norm = X / np.linalg.norm(X, axis=1, keepdims=True)
@@ -53,29 +198,34 @@ def jaccard_distance(labels):
     diff = labels[:, None] != labels[None, :]
     return diff[np.triu_indices(labels.size, k=1)].astype(float)
 
+def robust_consensus(dmats):
+    """
+    Ranked mean of median/MAD-normalised condensed RDMs.
+
+    dmats : (n_models, n_pairs) array (or sequence of equal-length RDMs);
+    the medians and MADs of all models come from one reduction along pairs.
+    """
+    from scipy.stats import rankdata as scipy_rankdata
+    D = np.asarray(dmats, dtype=np.float64)
+    med = np.median(D, axis=1, keepdims=True)
+    mad = np.median(np.abs(D - med), axis=1, keepdims=True)
+    return scipy_rankdata(((D - med) / (mad + 1e-9)).mean(axis=0))
+
 def robust_rdm(feat_list):
-    dmats = [pdist(f, 'euclidean') for f in feat_list]
-    normed = np.stack(
-        [(d - np.median(d)) / (np.median(np.abs(d - np.median(d))) + 1e-9) for d in dmats],
-        axis=0,
-    )
-    return scipy_rankdata(normed.mean(axis=0))
+    from scipy.spatial.distance import pdist
+    return robust_consensus([pdist(f, 'euclidean') for f in feat_list])
 
 def rank_data_batch(arr, n_batch):
-    n = arr.shape[1]
-    out = np.empty_like(arr)
-    for i in range(0, n, n_batch):
-        out[:, i:i + n_batch] = rank_data(arr[:, i:i + n_batch])
-    out[:, -n % n_batch:] = rank_data(arr[:, -n % n_batch:])
-    return out
+    return rank_along_axis(arr, axis=0, max_bytes=n_batch * arr.shape[0] * _RANK_BYTES_PER_ELEM)
 
 def condensed(mat):
+    from scipy.spatial.distance import pdist
     return pdist(mat, metric="euclidean")
 
-@jit
 def sqeucl(mat, vec):
     """row-wise mean squared distance to vec"""
-    return jnp.mean((mat - vec)**2, axis=1)
+    from utils import kernels
+    return kernels.sqeucl(mat, vec)
 
 def training_kind(name: str) -> str:
     lo = name.lower()
@@ -96,27 +246,168 @@ def training_kind(name: str) -> str:
     # Standard labels trained on ImageNet (ResNet, VGG, ConvNeXt, Swin, DeiT, standard ViT, etc.)
     return "Supervised"
 
-def round_robin_pairs(n: int, rng):
-    players, rounds = list(range(n)), []
-    for _ in range(n - 1):
-        pairs = [(players[i], players[-i-1]) for i in range(n // 2)]
-        rng.shuffle(pairs)
-        rounds.append(pairs)
-        players = [players[0]] + [players[-1]] + players[1:-1]
+def _round_players(n, r):
+    """Player order of round r: player 0 stays, the others rotate right by r."""
+    return np.concatenate(([0], 1 + (np.arange(n - 1) - r) % (n - 1)))
+
+def iter_round_robin(n, rng, n_rounds=None):
+    """
+    Lazily yield round-robin rounds as (n // 2, 2) integer arrays.
+
+    Round r pairs position i with position n-1-i of the rotated player order
+    and shuffles the pair order with `rng.shuffle`, so each round equals the
+    one `round_robin_pairs` builds from the same generator state. Only the
+    rounds actually drawn consume `rng` (see `round_robin_schedule`).
+    """
+    m = n // 2
+    order = np.empty(m, dtype=np.int64)
+    for r in range(n - 1 if n_rounds is None else n_rounds):
+        players = _round_players(n, r)
+        order[:] = np.arange(m)
+        rng.shuffle(order)
+        yield np.stack([players[:m], players[::-1][:m]], axis=1)[order]
+
+def round_robin_schedule(n: int, rng, n_rounds=None, consume_all=True):
+    """
+    First `n_rounds` rounds (default all n-1) as one (n_rounds, n // 2, 2) array.
+
+    With `consume_all` the generator is advanced through the shuffles of the
+    remaining rounds as well, leaving `rng` where `round_robin_pairs` leaves
+    it, so draws made after the schedule (per-run seeds) are unchanged.
+    """
+    n_rounds = n - 1 if n_rounds is None else min(n_rounds, n - 1)
+    rounds = np.stack(list(iter_round_robin(n, rng, n_rounds)))
+    if consume_all:
+        order = np.arange(n // 2)
+        for _ in range(n - 1 - n_rounds):
+            rng.shuffle(order)
     return rounds
 
+def round_batches(pairs, batch_size=16):
+    """
+    Index matrix (n_batches, batch_size) of one round, or (n_rounds, n_batches,
+    batch_size) of a schedule; a trailing incomplete batch is dropped.
+    """
+    pairs = np.asarray(pairs, dtype=np.int64)
+    flat = pairs.reshape(*pairs.shape[:-2], -1)
+    n_batches = flat.shape[-1] // batch_size
+    return flat[..., :n_batches * batch_size].reshape(*flat.shape[:-1], n_batches, batch_size)
+
+def round_robin_pairs(n: int, rng):
+    return [list(map(tuple, r.tolist())) for r in round_robin_schedule(n, rng)]
+
 def pairs_to_batches(pairs_round, batch_size=16):
-    flat = [j for p in pairs_round for j in p]
-    return [
-        np.array(flat[i : i + batch_size], int)
-        for i in range(0, len(flat), batch_size)
-        if i + batch_size <= len(flat)
-    ]
-
-def perm_signflip_onesample(vec, n_perm, greater=True):
-    vec, obs, rnd = np.asarray(vec), vec.mean(), np.empty(n_perm)
-    for i in range(n_perm):
-        rnd[i] = (vec * rng_global.choice([-1, 1], size=vec.shape[0])).mean()
+    return list(round_batches(pairs_round, batch_size))
+
+# relative slack so the identity permutation always counts as ">= obs"
+_PERM_TIE_EPS = 1e-12
+
+def _perm_null(weight_blocks, values, exceeds, keep_null):
+    """Run weight-matrix chunks through one matmul each; count exceedances."""
+    rnd, count, total = [], 0, 0
+    for W in weight_blocks:
+        r = W @ values
+        count += int(exceeds(r).sum())
+        total += r.shape[0]
+        if keep_null:
+            rnd.append(r)
+    return (np.concatenate(rnd) if keep_null else None), count, total
+
+def _use_exact(exact, n_total, n_perm):
+    return n_total <= n_perm if exact == "auto" else bool(exact)
+
+def _exceeds(obs, tail_greater):
+    tol = _PERM_TIE_EPS * max(1.0, abs(obs))
+    if tail_greater:
+        return lambda r: r >= obs - tol
+    return lambda r: np.abs(r) >= abs(obs) - tol
+
+def perm_signflip_onesample(vec, n_perm, greater=True, *, rng=None, chunk=2000,
+                            exact=False, keep_null=True):
+    """
+    One-sample sign-flip permutation test of mean(vec).
+
+    Sign matrices are drawn `chunk` rows at a time and all null means of a
+    chunk come from one matmul; the draws consume `rng` (default
+    `rng_global`) exactly like the former one-permutation loop, so seeded
+    results are unchanged and independent of `chunk`.
+    exact      : True enumerates all 2**n sign patterns, "auto" does so when
+                 2**n <= n_perm; p is then the exact fraction (no +1).
+    keep_null  : False streams the chunks and returns rnd=None.
+    Returns (obs, rnd, p).
+    """
+    vec = np.asarray(vec, dtype=float)
+    n, obs = vec.shape[0], vec.mean()
+    rng = rng_global if rng is None else rng
+    exceeds = _exceeds(obs, greater)
+
+    if _use_exact(exact, 2**n, n_perm):
+        bits = np.arange(n)
+        blocks = (
+            (((np.arange(s, min(s + chunk, 2**n))[:, None] >> bits) & 1) * 2 - 1) / n
+            for s in range(0, 2**n, chunk)
+        )
+        rnd, count, total = _perm_null(blocks, vec, exceeds, keep_null)
+        return obs, rnd, count / total
+
+    blocks = (
+        (2 * rng.integers(0, 2, size=(min(chunk, n_perm - s), n)) - 1) / n
+        for s in range(0, n_perm, chunk)
+    )
+    rnd, count, _ = _perm_null(blocks, vec, exceeds, keep_null)
+    return obs, rnd, (count + 1) / (n_perm + 1)
+
+def _label_weights(x_idx, n, n_x):
+    W = np.full((x_idx.shape[0], n), -1.0 / (n - n_x))
+    np.put_along_axis(W, x_idx, 1.0 / n_x, axis=1)
+    return W
+
+def condensed_index_map(n):
+    """(n, n) map from a stimulus pair (i, j), i != j, to its pdist position."""
+    iu, ju = get_upper_indices(n)
+    K = np.zeros((n, n), dtype=np.int32 if iu.size < 2**31 else np.intp)
+    K[iu, ju] = np.arange(iu.size)
+    K[ju, iu] = K[iu, ju]
+    return K
+
+def mantel_rsa(rdm_fixed, rdm_permuted, n_perm, greater=True, *, rng=None, chunk=2000,
+               max_bytes=256 * 2**20):
+    """
+    Stimulus-label permutation test of the Spearman RSA between two
+    condensed RDMs (as returned by pdist) over the same n stimuli.
+
+    Relabelling the stimuli of `rdm_permuted` only reorders its entries, so
+    it is ranked once and each permutation gathers its condensed
+    upper-triangle positions through `condensed_index_map`. Mean and norm
+    of the centred ranks are permutation invariant, so every chunk of
+    nulls is one gather plus one matrix-vector product. Permutations are
+    drawn from `rng` (default `rng_global`) like `rng.permutation(n)`
+    calls in a loop, and the statistic equals `spearman_corr_ranked`
+    applied to re-ranked pdist outputs of the permuted stimuli.
+    At most `chunk` permutations are gathered at once, fewer when their
+    working set would exceed `max_bytes` (~20 bytes per permutation and
+    stimulus pair); the chunking does not change the draws.
+    Returns (obs, rnd, p).
+    """
+    rng = rng_global if rng is None else rng
+    x = rank_along_axis(np.asarray(rdm_fixed, dtype=float))
+    y = rank_along_axis(np.asarray(rdm_permuted, dtype=float))
+    n = int(round((1 + np.sqrt(1 + 8 * y.size)) / 2))
+    if n * (n - 1) // 2 != y.size or x.size != y.size:
+        raise ValueError("rdm_fixed and rdm_permuted must be condensed RDMs of equal size")
+    xc, yc = x - x.mean(), y - y.mean()
+    xc /= np.sqrt((xc**2).sum() * (yc**2).sum())
+    obs = float(xc @ yc)
+
+    K = condensed_index_map(n)
+    iu, ju = get_upper_indices(n)
+    base = np.arange(n, dtype=K.dtype)
+    chunk = max(1, min(chunk, int(max_bytes) // (y.size * _MANTEL_BYTES_PER_PAIR)))
+    rnd = np.empty(n_perm)
+    for start in range(0, n_perm, chunk):
+        perms = rng.permuted(np.tile(base, (min(chunk, n_perm - start), 1)), axis=1)
+        pos = K[perms[:, iu], perms[:, ju]]
+        rnd[start:start + perms.shape[0]] = yc[pos] @ xc
     p = (
         ((rnd >= obs).sum() + 1) / (n_perm + 1)
         if greater
@@ -124,19 +415,52 @@ def perm_signflip_onesample(vec, n_perm, greater=True):
     )
     return obs, rnd, p
 
-def perm_diff_independent(x, y, n_perm, two_sided=True):
-    x, y = np.asarray(x), np.asarray(y)
-    obs  = x.mean() - y.mean()
-    combined, n_x, rnd = np.concatenate([x, y]), x.shape[0], np.empty(n_perm)
-    for i in range(n_perm):
-        perm = rng_global.permutation(combined)
-        rnd[i] = perm[:n_x].mean() - perm[n_x:].mean()
-    if two_sided:
-        p = ((np.abs(rnd) >= abs(obs)).sum() + 1) / (n_perm + 1)
-    else:
-        p = ((rnd >= obs).sum() + 1) / (n_perm + 1)
-    return obs, rnd, p
+def _combination_weights(n, n_x, chunk):
+    combos = itertools.combinations(range(n), n_x)
+    while True:
+        x_idx = np.array(list(itertools.islice(combos, chunk)), dtype=np.intp)
+        if x_idx.size == 0:
+            return
+        yield _label_weights(x_idx.reshape(-1, n_x), n, n_x)
+
+def perm_diff_independent(x, y, n_perm, two_sided=True, *, rng=None, chunk=2000,
+                          exact=False, keep_null=True):
+    """
+    Two-sample label-permutation test of mean(x) - mean(y).
+
+    Each chunk of relabellings becomes a (chunk, n) matrix of +1/n_x and
+    -1/n_y weights applied to the pooled sample in one matmul. Random
+    relabellings consume `rng` (default `rng_global`) exactly like the
+    former `rng.permutation` loop. `exact` enumerates all C(n, n_x)
+    splits (True, or "auto" when C(n, n_x) <= n_perm); `keep_null=False`
+    streams and returns rnd=None.
+    Returns (obs, rnd, p).
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    obs = x.mean() - y.mean()
+    combined, n_x = np.concatenate([x, y]), x.shape[0]
+    n = combined.shape[0]
+    rng = rng_global if rng is None else rng
+    exceeds = _exceeds(obs, not two_sided)
+
+    if _use_exact(exact, math.comb(n, n_x), n_perm):
+        blocks = _combination_weights(n, n_x, chunk)
+        rnd, count, total = _perm_null(blocks, combined, exceeds, keep_null)
+        return obs, rnd, count / total
+
+    base = np.arange(n)
+    blocks = (
+        _label_weights(
+            rng.permuted(np.tile(base, (min(chunk, n_perm - s), 1)), axis=1)[:, :n_x], n, n_x
+        )
+        for s in range(0, n_perm, chunk)
+    )
+    rnd, count, _ = _perm_null(blocks, combined, exceeds, keep_null)
+    return obs, rnd, (count + 1) / (n_perm + 1)
 
 def zscore(obs, perm):
     mu, sd = perm.mean(0), perm.std(0, ddof=0)
     return (obs - mu) / sd, (perm - mu) / sd
+
+
+instrument_module(globals())
@@ -0,0 +1,434 @@
+# utils/cache.py
+"""
+cache.py
+
+Content-addressed on-disk memoization for expensive analysis stages
+(permutation nulls, per-network RSA batches, decoding matrices), so that
+re-running a notebook only recomputes what changed.
+It includes:
+  - `fingerprint`, a fast key of arrays (shape, dtype and a full blake2b
+    digest, or evenly spaced byte samples above `full_hash_bytes`),
+    DataFrames, Generators (their bit-generator state), functions (their
+    bytecode, constants, defaults and closure contents; partials by their
+    function and arguments) and plain parameters
+  - `DiskCache`, which stores results as .npy (single array) or .npz
+    (tuples / lists / dicts of arrays and scalars) next to a JSON manifest,
+    and evicts the least recently used entries above a size cap
+  - `memoize`, a decorator keyed on the function, its bound arguments and
+    a `version` string; when a Generator is passed, its state after the
+    call is stored too and restored on a hit, so the downstream random
+    stream is the same whether or not the stage was recomputed
+
+Layout on disk:
+    root/<function>/<key>.npy|.npz    result arrays
+    root/<function>/<key>.json        {"tree", "rng", "nbytes", "created"}
+
+The default cache lives in $UTILS_CACHE_DIR (default ".utils_cache"), is
+capped by $UTILS_CACHE_MAX_GB (default 5) and is bypassed entirely when
+UTILS_CACHE=0. Calls whose `rng` is None are not cached: they draw from a
+global or fresh generator whose state is not part of the arguments; neither
+are calls with a callable argument that cannot be fingerprinted (callable
+instances, closures over themselves).
+"""
+
+import os
+import sys
+import json
+import time
+import types
+import pickle
+import hashlib
+import inspect
+import functools
+
+import numpy as np
+import pandas as pd
+
+CACHE_ENV = "UTILS_CACHE"
+DIR_ENV = "UTILS_CACHE_DIR"
+SIZE_ENV = "UTILS_CACHE_MAX_GB"
+
+_RNG_PARAMS = ("rng", "random_state")
+
+
+# ---------------------------------------------------------------------------
+# Keys
+# ---------------------------------------------------------------------------
+def _array_digest(a, h, full_hash_bytes, n_samples=64, sample_bytes=4096):
+    a = np.asarray(a)
+    h.update(f"ndarray{a.shape}{a.dtype.str}".encode())
+    if a.dtype.hasobject:                             # labels, names: hash the values
+        h.update(pickle.dumps(a.tolist(), protocol=4))
+        return
+    if a.nbytes <= full_hash_bytes:
+        h.update(memoryview(np.ascontiguousarray(a)).cast("B"))
+        return
+    raw = np.ascontiguousarray(a).reshape(-1).view(np.uint8)
+    starts = np.linspace(0, raw.size - sample_bytes, n_samples).astype(np.int64)
+    for s in starts:
+        h.update(raw[s:s + sample_bytes].tobytes())
+
+
+class _Unhashable(TypeError):
+    """An argument that has no reliable content key; the call is not cached."""
+
+
+def _code_digest(code, h):
+    h.update(code.co_code)
+    h.update(repr((code.co_names, code.co_varnames, code.co_freevars)).encode())
+    for c in code.co_consts:
+        if isinstance(c, types.CodeType):               # nested functions, lambdas
+            _code_digest(c, h)
+        else:
+            h.update(f"{type(c).__name__}:{c!r}".encode())
+
+
+def _function_digest(func, h, full_hash_bytes):
+    h.update(f"function {func.__module__}.{func.__qualname__}".encode())
+    _code_digest(func.__code__, h)
+    _update(h, func.__defaults__ or (), full_hash_bytes)
+    _update(h, func.__kwdefaults__ or {}, full_hash_bytes)
+    for cell in func.__closure__ or ():
+        try:
+            value = cell.cell_contents
+        except ValueError:                              # not yet assigned
+            h.update(b"empty cell")
+            continue
+        _update(h, value, full_hash_bytes)
+
+
+def _importable(obj):
+    """True for a callable reachable by its module and qualified name (e.g. np.mean)."""
+    target = sys.modules.get(getattr(obj, "__module__", None) or "")
+    for part in str(getattr(obj, "__qualname__", "<")).split("."):
+        target = getattr(target, part, None)
+    return target is obj
+
+
+def _update(h, obj, full_hash_bytes):
+    if isinstance(obj, np.ndarray):
+        _array_digest(obj, h, full_hash_bytes)
+    elif isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        h.update(type(obj).__name__.encode())
+        if isinstance(obj, pd.DataFrame):
+            _update(h, list(map(str, obj.columns)), full_hash_bytes)
+            for col in obj.columns:
+                _array_digest(obj[col].to_numpy(), h, full_hash_bytes)
+        else:
+            _array_digest(obj.to_numpy(), h, full_hash_bytes)
+        if not isinstance(obj, pd.Index):
+            _array_digest(obj.index.to_numpy(), h, full_hash_bytes)
+    elif isinstance(obj, np.random.Generator):
+        h.update(repr(obj.bit_generator.state).encode())
+    elif isinstance(obj, dict):
+        h.update(b"dict")
+        for k in sorted(obj, key=repr):
+            _update(h, k, full_hash_bytes)
+            _update(h, obj[k], full_hash_bytes)
+    elif isinstance(obj, (list, tuple)):
+        h.update(f"{type(obj).__name__}{len(obj)}".encode())
+        for v in obj:
+            _update(h, v, full_hash_bytes)
+    elif isinstance(obj, functools.partial):
+        h.update(b"partial")
+        _update(h, obj.func, full_hash_bytes)
+        _update(h, obj.args, full_hash_bytes)
+        _update(h, obj.keywords, full_hash_bytes)
+    elif inspect.isfunction(obj):
+        _function_digest(obj, h, full_hash_bytes)
+    elif inspect.ismethod(obj):
+        _update(h, obj.__func__, full_hash_bytes)
+        _update(h, obj.__self__, full_hash_bytes)
+    elif isinstance(obj, (type, np.dtype, np.ufunc)) or inspect.isbuiltin(obj) or _importable(obj):
+        h.update(f"{getattr(obj, '__module__', '')}.{getattr(obj, '__qualname__', obj)}".encode())
+    elif callable(obj):
+        raise _Unhashable(f"cannot fingerprint callable {obj!r}")
+    elif isinstance(obj, np.generic):
+        h.update(f"{obj.dtype.str}{obj!r}".encode())
+    else:
+        h.update(f"{type(obj).__name__}:{obj!r}".encode())
+
+
+def fingerprint(*objs, full_hash_bytes=64 * 2**20):
+    """
+    Hex key of `objs`.
+
+    Arrays up to `full_hash_bytes` are hashed in full; larger ones (memory
+    maps of whole feature sets) by shape, dtype and 64 evenly spaced 4 KiB
+    samples, which is enough to tell different inputs apart in practice but
+    will not notice an edit confined to unsampled bytes.
+
+    Functions are keyed by their code, defaults and closure contents, not by
+    the module globals they read. Raises TypeError for callables that cannot
+    be keyed this way (e.g. instances with `__call__`).
+    """
+    h = hashlib.blake2b(digest_size=16)
+    try:
+        for obj in objs:
+            _update(h, obj, full_hash_bytes)
+    except RecursionError:                                  # self-referencing closures
+        raise _Unhashable("cannot fingerprint a self-referencing argument") from None
+    return h.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Result (de)serialization
+# ---------------------------------------------------------------------------
+def _flatten(obj, arrays):
+    """JSON tree of `obj` with arrays replaced by references into `arrays`."""
+    if isinstance(obj, np.ndarray) and not obj.dtype.hasobject:
+        arrays[f"a{len(arrays)}"] = obj
+        return {"array": f"a{len(arrays) - 1}"}
+    if isinstance(obj, tuple):
+        return {"tuple": [_flatten(v, arrays) for v in obj]}
+    if isinstance(obj, list):
+        return {"list": [_flatten(v, arrays) for v in obj]}
+    if isinstance(obj, dict) and all(isinstance(k, str) for k in obj):
+        return {"dict": [[k, _flatten(v, arrays)] for k, v in obj.items()]}
+    if isinstance(obj, np.generic) and not isinstance(obj, np.object_):
+        return {"scalar": obj.item(), "dtype": obj.dtype.str}
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return {"value": obj}
+    # DataFrames, object arrays, tuple-keyed dicts: stored as a pickled blob
+    arrays[f"a{len(arrays)}"] = np.frombuffer(pickle.dumps(obj, protocol=4), dtype=np.uint8)
+    return {"pickle": f"a{len(arrays) - 1}"}
+
+
+def _unflatten(node, arrays):
+    if "array" in node:
+        return arrays[node["array"]]
+    if "tuple" in node:
+        return tuple(_unflatten(v, arrays) for v in node["tuple"])
+    if "list" in node:
+        return [_unflatten(v, arrays) for v in node["list"]]
+    if "dict" in node:
+        return {k: _unflatten(v, arrays) for k, v in node["dict"]}
+    if "scalar" in node:
+        return np.dtype(node["dtype"]).type(node["scalar"])
+    if "pickle" in node:
+        return pickle.loads(np.asarray(arrays[node["pickle"]]).tobytes())
+    return node["value"]
+
+
+# ---------------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------------
+class DiskCache:
+    """
+    Directory of memoized results with least-recently-used eviction.
+
+    Parameters
+    ----------
+    root : str
+        Cache directory; created on first write.
+    max_bytes : int or None
+        Total size above which the least recently used entries are removed
+        after each write (None: unbounded).
+    full_hash_bytes : int
+        Arrays larger than this are keyed by sampled bytes (see `fingerprint`).
+    mmap : bool
+        Open single-array results as read-only memory maps.
+    """
+
+    def __init__(self, root, max_bytes=5 * 2**30, full_hash_bytes=64 * 2**20, mmap=False):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.full_hash_bytes = full_hash_bytes
+        self.mmap = mmap
+        self.hits = 0
+        self.misses = 0
+
+    def _paths(self, namespace, key):
+        base = os.path.join(self.root, namespace, key)
+        return base + ".json", base + ".npy", base + ".npz"
+
+    def get(self, namespace, key):
+        """(True, value, rng_state) for a stored entry, else (False, None, None)."""
+        meta_path, npy, npz = self._paths(namespace, key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta["file"] == "npy":
+                arrays = {"a0": np.load(npy, mmap_mode="r" if self.mmap else None)}
+            else:
+                with np.load(npz) as z:
+                    arrays = {k: z[k] for k in z.files}
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return False, None, None
+        os.utime(meta_path)                                # LRU clock
+        self.hits += 1
+        return True, _unflatten(meta["tree"], arrays), meta.get("rng")
+
+    def put(self, namespace, key, value, rng_state=None):
+        """Store `value` under `key`; returns the number of bytes written."""
+        meta_path, npy, npz = self._paths(namespace, key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        arrays = {}
+        tree = _flatten(value, arrays)
+        json.dumps([tree, rng_state])                      # fail before writing anything
+        tag = f".tmp{os.getpid()}"
+        if set(tree) == {"array"}:
+            kind, data_path = "npy", npy
+            np.save(data_path + tag + ".npy", arrays["a0"])
+        else:
+            kind, data_path = "npz", npz
+            np.savez(data_path + tag + ".npz", **arrays)
+        os.replace(data_path + tag + "." + kind, data_path)
+        nbytes = os.path.getsize(data_path)
+        meta = {"file": kind, "tree": tree, "rng": rng_state, "nbytes": nbytes,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        with open(meta_path + tag, "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + tag, meta_path)             # the entry exists from here on
+        if self.max_bytes is not None:
+            self.evict(self.max_bytes)
+        return nbytes
+
+    def entries(self):
+        """(last_used, nbytes, manifest path, data path) of every entry."""
+        out = []
+        if not os.path.isdir(self.root):
+            return out
+        for namespace in os.listdir(self.root):
+            folder = os.path.join(self.root, namespace)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if not name.endswith(".json"):
+                    continue
+                meta_path = os.path.join(folder, name)
+                base = meta_path[:-len(".json")]
+                data = base + ".npy" if os.path.exists(base + ".npy") else base + ".npz"
+                try:
+                    size = os.path.getsize(data) if os.path.exists(data) else 0
+                    out.append((os.path.getmtime(meta_path), size, meta_path, data))
+                except OSError:                             # removed concurrently
+                    continue
+        return out
+
+    def size(self):
+        """Total bytes of stored results."""
+        return sum(e[1] for e in self.entries())
+
+    def evict(self, max_bytes):
+        """Remove least recently used entries until at most `max_bytes` remain."""
+        entries = sorted(self.entries())
+        total = sum(e[1] for e in entries)
+        removed = 0
+        for _, nbytes, meta_path, data in entries:
+            if total <= max_bytes:
+                break
+            for p in (meta_path, data):
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+            total -= nbytes
+            removed += 1
+        return removed
+
+    def clear(self, namespace=None):
+        """Remove every entry (or those of one function)."""
+        for _, _, meta_path, data in self.entries():
+            if namespace is None or os.path.basename(os.path.dirname(meta_path)) == namespace:
+                for p in (meta_path, data):
+                    try:
+                        os.remove(p)
+                    except FileNotFoundError:
+                        pass
+
+    def memoize(self, func=None, *, name=None, version="", ignore=()):
+        """
+        Decorator caching `func` on its bound arguments.
+
+        Parameters
+        ----------
+        name : str, optional
+            Namespace of the entries (default "<module>.<function>").
+        version : str
+            Bump to invalidate entries after changing the function's code.
+        ignore : iterable of str
+            Arguments left out of the key (e.g. `workers`, `verbose`).
+
+        The wrapper has `.uncached` (the original function), `.key(*args,
+        **kwargs)` and `.clear()`.
+        """
+        if func is None:
+            return functools.partial(self.memoize, name=name, version=version, ignore=ignore)
+        sig = inspect.signature(func)
+        namespace = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__qualname__}"
+        ignore = set(ignore)
+
+        def bind(args, kwargs):
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return bound.arguments
+
+        def digest(arguments):
+            kept = {k: v for k, v in arguments.items() if k not in ignore}
+            return fingerprint(namespace, version, kept, full_hash_bytes=self.full_hash_bytes)
+
+        def key(*args, **kwargs):
+            return digest(bind(args, kwargs))
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return func(*args, **kwargs)
+            arguments = bind(args, kwargs)
+            if any(arguments.get(p, 0) is None for p in _RNG_PARAMS):
+                return func(*args, **kwargs)
+            gens = [(k, v) for k, v in arguments.items() if isinstance(v, np.random.Generator)]
+            try:
+                k = digest(arguments)
+            except _Unhashable:
+                return func(*args, **kwargs)
+            hit, value, rng_state = self.get(namespace, k)
+            if hit:
+                for (_, gen), state in zip(gens, rng_state or []):
+                    gen.bit_generator.state = state
+                return value
+            value = func(*args, **kwargs)
+            try:
+                self.put(namespace, k, value, [gen.bit_generator.state for _, gen in gens])
+            except (OSError, TypeError, ValueError, pickle.PicklingError):
+                pass                                        # an unstorable result is just not cached
+            return value
+
+        wrapper.uncached = func
+        wrapper.key = key
+        wrapper.clear = lambda: self.clear(namespace)
+        return wrapper
+
+
+def enabled():
+    """False when UTILS_CACHE is set to 0/false/off."""
+    return os.environ.get(CACHE_ENV, "1").strip().lower() not in ("0", "false", "off", "no")
+
+
+_default = None
+
+
+def default_cache():
+    """The process-wide cache configured from UTILS_CACHE_DIR / UTILS_CACHE_MAX_GB."""
+    global _default
+    if _default is None:
+        max_gb = float(os.environ.get(SIZE_ENV, "5"))
+        _default = DiskCache(os.environ.get(DIR_ENV, ".utils_cache"), max_bytes=int(max_gb * 2**30))
+    return _default
+
+
+def memoize(func=None, *, name=None, version="", ignore=()):
+    """
+    `DiskCache.memoize` on the default cache.
+
+        from utils.cache import memoize
+        from utils.analysis_utils import crosstemporal_rsa
+
+        crosstemporal_rsa = memoize(crosstemporal_rsa)
+        obs, surrogates = crosstemporal_rsa(odd, even, batches, rng, n_surrogates=10_000)
+    """
+    if func is None:
+        return functools.partial(memoize, name=name, version=version, ignore=ignore)
+    return default_cache().memoize(func, name=name, version=version, ignore=ignore)
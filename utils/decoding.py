@@ -0,0 +1,222 @@
+# utils/decoding.py
+"""
+decoding.py
+
+Pairwise category decoding with leave-one-object-per-category-out folds,
+as used for the neural and DNN confusion matrices.
+It includes:
+  - SharedFeatures (utils.executor.SharedArrays), which copies every
+    feature matrix (time windows, networks, ...) into shared memory once;
+    the `utils.executor.Executor` workers attach to it instead of receiving
+    a pickled copy per task
+  - decode_pair: one PCA fit per category pair (outside the pair, to avoid
+    leakage), the pair projected once and reused by every (o1, o0) fold,
+    and logistic regressions warm-started from the previous fold
+  - decode_all: every (feature set, pair) task on one Executor pool, with
+    the accuracy matrix, FDR significance and per-trial probabilities
+    assembled per feature set
+  - parallel_decoding, a drop-in for the notebooks' single-matrix helper
+"""
+
+import os
+from itertools import combinations
+
+import numpy as np
+
+from utils.executor import Executor, SharedArrays
+from utils.instrumentation import instrument_module
+
+
+def decode_pair(cat1, cat2, X_flat, labels, obj_names, n_components=50, warm_start=True,
+                max_iter=500):
+    """
+    Pairwise decoding with leave-one-object-per-category out.
+
+    Parameters
+    ----------
+    cat1, cat2 : label
+        Categories to discriminate; class 1 is `cat1`.
+    X_flat : ndarray, shape (n_trials, n_features)
+    labels, obj_names : ndarray, shape (n_trials,)
+        Category and object of every trial.
+    n_components : int, optional
+        PCA components, fitted on the trials outside the pair.
+    warm_start : bool, optional
+        Start each fold's lbfgs from the previous fold's coefficients.
+        Folds differ by two objects, so this converges in far fewer
+        iterations to the same optimum (up to the solver tolerance).
+    max_iter : int, optional
+        lbfgs iteration cap per fold.
+
+    Returns
+    -------
+    (cat1, cat2, acc, pval, global_probs)
+        `global_probs` holds, for every trial of the pair, the mean
+        probability of its correct class over the folds that tested it
+        (NaN elsewhere).
+    """
+    from scipy.stats import binomtest
+    from sklearn.decomposition import PCA
+    from sklearn.linear_model import LogisticRegression
+
+    mask_pair = (labels == cat1) | (labels == cat2)
+    y_pair = (labels[mask_pair] == cat1).astype(int)
+    obj_pair = obj_names[mask_pair]
+    global_probs = np.full(len(labels), np.nan)
+
+    # PCA fitted outside pair images; the projection is per-trial, so the
+    # pair is transformed once and sliced by every fold
+    pca = PCA(n_components=n_components, random_state=42).fit(X_flat[~mask_pair])
+    Z = pca.transform(X_flat[mask_pair])
+
+    n_pair = len(y_pair)
+    sum_pos = np.zeros(n_pair)
+    counts = np.zeros(n_pair, dtype=int)
+    objs1 = np.unique(obj_pair[y_pair == 1])
+    objs0 = np.unique(obj_pair[y_pair == 0])
+    clf = LogisticRegression(max_iter=max_iter, solver="lbfgs", random_state=42,
+                             warm_start=warm_start)
+
+    for o1 in objs1:
+        for o0 in objs0:
+            te_mask = (obj_pair == o1) | (obj_pair == o0)
+            tr_mask = ~te_mask
+            if not tr_mask.any() or not te_mask.any():
+                continue
+            clf.fit(Z[tr_mask], y_pair[tr_mask])
+            idx_te = np.flatnonzero(te_mask)
+            sum_pos[idx_te] += clf.predict_proba(Z[te_mask])[:, 1]   # P(class==cat1)
+            counts[idx_te] += 1
+
+    valid = counts > 0
+    if not valid.any():
+        return (cat1, cat2, np.nan, np.nan, global_probs)
+
+    mean_pos = np.full(n_pair, np.nan)
+    mean_pos[valid] = sum_pos[valid] / counts[valid]
+    mean_corr = np.where(y_pair == 1, mean_pos, 1 - mean_pos)
+
+    preds = (mean_pos[valid] >= 0.5).astype(int)
+    acc = (preds == y_pair[valid]).mean()
+    k = int(acc * valid.sum())
+    pval = binomtest(k, n=valid.sum(), p=0.5, alternative="greater").pvalue
+
+    global_probs[mask_pair] = mean_corr
+    return (cat1, cat2, acc, pval, global_probs)
+
+
+# shared-memory feature sets; the general version lives in utils.executor
+SharedFeatures = SharedArrays
+
+
+def _decode_task(task, arrays, rng):
+    """Decode a chunk of (feature set index, cat1, cat2) tasks; `rng` is unused."""
+    labels, obj_names, kwargs = arrays["decode"]
+    return [(i, decode_pair(cat1, cat2, np.asarray(arrays[i]), labels, obj_names, **kwargs))
+            for i, cat1, cat2 in task]
+
+
+def _fdr_bh(pvals):
+    """Benjamini-Hochberg adjusted p-values (NaN entries are left out)."""
+    pvals = np.asarray(pvals, dtype=float)
+    q = np.full(pvals.shape, np.nan)
+    ok = np.flatnonzero(~np.isnan(pvals))
+    if ok.size == 0:
+        return q
+    order = ok[np.argsort(pvals[ok])]
+    ranked = pvals[order] * ok.size / np.arange(1, ok.size + 1)
+    q[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1.0)
+    return q
+
+
+def pair_matrices(results, labels, cat_pairs, alpha=0.05):
+    """
+    Assemble decode_pair results the way parallel_decoding does.
+
+    Returns
+    -------
+    A : ndarray, shape (n_categories, n_categories)
+        Accuracies on the upper triangle (NaN elsewhere).
+    S : ndarray of bool
+        Upper-triangle cells with FDR (BH) q < alpha.
+    probs : dict
+        (cat1, cat2) -> per-trial correct-class probabilities.
+    mean_trial : ndarray, shape (n_trials,)
+        Per-trial mean over pairs.
+    """
+    by_pair = {(c1, c2): (a, p, pr) for c1, c2, a, p, pr in results}
+    probs = {pair: by_pair[pair][2] for pair in cat_pairs}
+    prob_matrix = np.stack([probs[pair] for pair in cat_pairs], axis=1)
+    with np.errstate(invalid="ignore"):
+        mean_trial = np.nanmean(prob_matrix, axis=1) if prob_matrix.size else np.full(len(labels), np.nan)
+    q = _fdr_bh([by_pair[pair][1] for pair in cat_pairs])
+
+    categories = np.unique(labels)
+    pos = {c: i for i, c in enumerate(categories)}
+    A = np.full((len(categories), len(categories)), np.nan)
+    S = np.zeros(A.shape, dtype=bool)
+    for (c1, c2), qv in zip(cat_pairs, q):
+        i, j = pos[c1], pos[c2]
+        if i < j:
+            A[i, j] = by_pair[(c1, c2)][0]
+            S[i, j] = qv < alpha
+    return A, S, probs, mean_trial
+
+
+def decode_all(features, labels, obj_names, cat_pairs=None, n_components=50, warm_start=True,
+               max_iter=500, alpha=0.05, workers=None, chunksize=4):
+    """
+    Pairwise decoding of several feature sets on one process pool.
+
+    Parameters
+    ----------
+    features : dict
+        Key -> (n_trials, n_features) array, e.g. {"early": X_early,
+        "late": X_late} or {network: X_net}. All sets share `labels` and
+        `obj_names` (same trial order).
+    labels, obj_names : ndarray, shape (n_trials,)
+    cat_pairs : list of tuple, optional
+        Defaults to all combinations of the sorted categories.
+    n_components, warm_start, max_iter :
+        See `decode_pair`.
+    alpha : float, optional
+        FDR level of the significance matrix.
+    workers : int, optional
+        Process count of the `utils.executor.Executor` (default:
+        os.cpu_count()); 1 runs in-process. Feature matrices go to shared
+        memory once, not per task.
+    chunksize : int, optional
+        (feature set, pair) tasks sent to a worker at a time.
+
+    Returns
+    -------
+    dict
+        Key -> (A, S, probs, mean_trial), see `pair_matrices`.
+    """
+    labels = np.asarray(labels)
+    obj_names = np.asarray(obj_names)
+    if cat_pairs is None:
+        cat_pairs = list(combinations(np.unique(labels), 2))
+    kwargs = dict(n_components=n_components, warm_start=warm_start, max_iter=max_iter)
+    keys = list(features)
+    # feature sets are shared under their position, so no key can clash with "decode"
+    tasks = [(i, c1, c2) for i in range(len(keys)) for c1, c2 in cat_pairs]
+    batches = [tasks[s:s + chunksize] for s in range(0, len(tasks), chunksize)]
+    workers = min(workers or os.cpu_count() or 1, max(len(batches), 1))
+
+    results = {key: [] for key in keys}
+    with Executor({i: features[key] for i, key in enumerate(keys)},
+                  consts={"decode": (labels, obj_names, kwargs)}, workers=workers) as ex:
+        for batch in ex.imap(_decode_task, batches):
+            for i, res in batch:
+                results[keys[i]].append(res)
+
+    return {key: pair_matrices(results[key], labels, cat_pairs, alpha) for key in keys}
+
+
+def parallel_decoding(X_flat, labels_cat, objects, cat_pairs, **kwargs):
+    """Decode every category pair of one feature matrix; returns (A, S, probs, mean_trial)."""
+    return decode_all({0: X_flat}, labels_cat, objects, cat_pairs, **kwargs)[0]
+
+
+instrument_module(globals())
@@ -0,0 +1,276 @@
+# utils/executor.py
+"""
+executor.py
+
+Process-parallel execution of independent Monte-Carlo tasks (runs,
+networks, permutation chunks) with results that do not depend on the
+worker count.
+It includes:
+  - `SharedArrays`, which copies named arrays (spike counts, feature
+    matrices) into shared memory once, and `attach_shared`, which maps them
+    in a worker without pickling
+  - `task_seeds`, per-task streams from `SeedSequence(seed).spawn`, or the
+    notebooks' `rng.integers(2**32)` seeds drawn in run order
+  - `Executor`, a process pool whose workers see the shared arrays and run
+    `func(task, arrays, rng)`; `map` returns results in task order,
+    `imap_unordered` yields them as they finish, and `reduce` merges them as
+    they arrive but strictly in task order (out-of-order results wait in a
+    buffer), so floating-point merges are bitwise identical for any
+    `workers`
+  - `NullMerge`, a streaming merge of partial null distributions (counts of
+    exceedances, Welford/Chan running moments from `moments.RunningStats`,
+    optionally the concatenated samples), and
+    `chunks` to split `n_perm` draws into tasks
+
+Workers pin BLAS to one thread, so `workers` processes use `workers` cores.
+`func` must be importable by the workers (module level; functions defined in
+a notebook work with the default fork start method on Linux).
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from utils.moments import RunningStats
+
+
+class SharedArrays:
+    """
+    Arrays copied once into shared memory.
+
+    Parameters
+    ----------
+    arrays : dict
+        Key (e.g. time window or network name) -> array.
+
+    Use as a context manager; the segments are unlinked on exit.
+    """
+
+    def __init__(self, arrays):
+        self._segments = []
+        self.specs = {}
+        try:
+            for key, X in arrays.items():
+                X = np.ascontiguousarray(X)
+                shm = shared_memory.SharedMemory(create=True, size=max(X.nbytes, 1))
+                self._segments.append(shm)
+                np.ndarray(X.shape, X.dtype, buffer=shm.buf)[...] = X
+                self.specs[key] = (shm.name, X.shape, X.dtype.str)
+        except BaseException:
+            self.close()
+            raise
+
+    def arrays(self):
+        """Views of the shared segments in this process."""
+        return {key: np.ndarray(shape, dtype, buffer=shm.buf)
+                for (key, (_, shape, dtype)), shm in zip(self.specs.items(), self._segments)}
+
+    def close(self):
+        for shm in self._segments:
+            shm.close()
+            shm.unlink()
+        self._segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach_shared(specs):
+    """Map `SharedArrays.specs` in a worker; returns (segments, arrays)."""
+    segments, arrays = [], {}
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        segments.append(shm)
+        arrays[key] = np.ndarray(shape, dtype, buffer=shm.buf)
+    return segments, arrays
+
+
+def task_seeds(n_tasks, seed=None, legacy_rng=None):
+    """
+    Seeds of `n_tasks` independent streams.
+
+    By default the children of `SeedSequence(seed)`; with `legacy_rng`, the
+    notebooks' per-run seeds `legacy_rng.integers(2**32)`, drawn one at a
+    time in run order so `default_rng(seed_r)` reproduces the serial loop.
+    """
+    if legacy_rng is not None:
+        return [int(legacy_rng.integers(2**32)) for _ in range(n_tasks)]
+    ss = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return ss.spawn(n_tasks)
+
+
+def chunks(n, size):
+    """(start, count) blocks covering range(n), e.g. permutation chunks."""
+    return [(s, min(size, n - s)) for s in range(0, n, size)]
+
+
+_WORKER = {}
+
+
+def _init_worker(specs, consts):
+    from threadpoolctl import threadpool_limits
+
+    segments, arrays = attach_shared(specs)
+    arrays.update(consts)
+    _WORKER.update(segments=segments, arrays=arrays, limits=threadpool_limits(1))
+
+
+def _run(payload):
+    func, i, task, seed = payload
+    return i, func(task, _WORKER["arrays"], np.random.default_rng(seed))
+
+
+class Executor:
+    """
+    Process pool for `func(task, arrays, rng)` calls.
+
+    Parameters
+    ----------
+    arrays : dict, optional
+        Large arrays shared with the workers through shared memory.
+    consts : dict, optional
+        Small objects (labels, metadata) pickled once per worker; merged
+        into the `arrays` dict the tasks receive.
+    workers : int, optional
+        Process count (default: os.cpu_count()); 1 runs in-process with the
+        same seeds and merge order.
+
+    Use as a context manager so the pool and segments are released.
+    """
+
+    def __init__(self, arrays=None, consts=None, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._arrays = dict(arrays or {})
+        self._consts = dict(consts or {})
+        self._shared = None
+        self._pool = None
+
+    def _start(self):
+        if self._pool is None and self.workers > 1:
+            self._shared = SharedArrays(self._arrays)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(self._shared.specs, self._consts))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._shared is not None:
+            self._shared.close()
+            self._shared = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _payloads(self, func, tasks, seed, seeds):
+        tasks = list(tasks)
+        seeds = task_seeds(len(tasks), seed) if seeds is None else list(seeds)
+        if len(seeds) != len(tasks):
+            raise ValueError(f"{len(seeds)} seeds for {len(tasks)} tasks")
+        return [(func, i, t, s) for i, (t, s) in enumerate(zip(tasks, seeds))]
+
+    def imap_unordered(self, func, tasks, seed=None, seeds=None):
+        """Yield (task index, result) pairs as tasks finish."""
+        payloads = self._payloads(func, tasks, seed, seeds)
+        if self.workers == 1 or len(payloads) <= 1:
+            local = {**self._arrays, **self._consts}
+            for func_, i, task, s in payloads:
+                yield i, func_(task, local, np.random.default_rng(s))
+            return
+        self._start()
+        for fut in as_completed([self._pool.submit(_run, p) for p in payloads]):
+            yield fut.result()
+
+    def imap(self, func, tasks, seed=None, seeds=None):
+        """Yield results in task order as soon as each prefix is complete."""
+        pending, nxt = {}, 0
+        for i, res in self.imap_unordered(func, tasks, seed, seeds):
+            pending[i] = res
+            while nxt in pending:
+                yield pending.pop(nxt)
+                nxt += 1
+
+    def map(self, func, tasks, seed=None, seeds=None):
+        """Results of every task, in task order."""
+        return list(self.imap(func, tasks, seed, seeds))
+
+    def reduce(self, func, tasks, merge, init, seed=None, seeds=None):
+        """
+        `merge(acc, result)` over all task results in task order, merging
+        each result as soon as all earlier ones are in; returns the final acc.
+        """
+        acc = init
+        for res in self.imap(func, tasks, seed, seeds):
+            acc = merge(acc, res)
+        return acc
+
+
+class NullMerge:
+    """
+    Streaming merge of partial null distributions.
+
+    Parameters
+    ----------
+    obs : float or ndarray, optional
+        Observed statistic; exceedances `null >= obs` (or `<=` with
+        greater=False, `|null| >= |obs|` with two_sided) are counted per
+        element.
+    keep : bool
+        Keep the samples (concatenated along axis 0 in merge order).
+
+    Feed (k, ...) blocks of null samples to `add`, e.g.
+    `ex.reduce(func, chunks(n_perm, 1000), NullMerge.add, NullMerge(obs))`;
+    `p_value` is (count + 1) / (n + 1).
+    """
+
+    def __init__(self, obs=None, keep=False, greater=True, two_sided=False):
+        self.obs = None if obs is None else np.asarray(obs)
+        self.keep = keep
+        self.greater = greater
+        self.two_sided = two_sided
+        self.n = 0
+        self.count = 0
+        self._stats = None
+        self._parts = []
+
+    def add(self, part):
+        """Merge a block of samples; returns self (so `NullMerge.add` is a reduce merge)."""
+        part = np.asarray(part)
+        if self._stats is None:
+            self._stats = RunningStats(part.shape[1:])
+        self._stats.update(part)
+        self.n += part.shape[0]
+        if self.obs is not None:
+            if self.two_sided:
+                hit = np.abs(part) >= np.abs(self.obs)
+            else:
+                hit = part >= self.obs if self.greater else part <= self.obs
+            self.count = self.count + hit.sum(axis=0)
+        if self.keep:
+            self._parts.append(part)
+        return self
+
+    @property
+    def mean(self):
+        return self._stats.mean
+
+    @property
+    def std(self):
+        # ddof=0, as analysis_utils.zscore
+        return np.sqrt(self._stats.var(ddof=0))
+
+    @property
+    def p_value(self):
+        return (self.count + 1) / (self.n + 1)
+
+    @property
+    def null(self):
+        return np.concatenate(self._parts, axis=0) if self._parts else None
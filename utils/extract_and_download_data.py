@@ -1,133 +1,227 @@
 import os
-import shutil
 import zipfile
 import hashlib
 import time
-import requests
-import pandas as pd
-from requests.exceptions import RequestException
+import json
+import zlib
+import struct
+import pickle
+import fnmatch
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from utils.instrumentation import instrument_module
+from utils.lazy import lazy_import
+
+# only the download path needs these; unzip and the manifest stay light
+requests = lazy_import("requests")
+pd = lazy_import("pandas")
+
+FIGSHARE_URL = 'https://figshare.com/ndownloader/files'
+MANIFEST_NAME = '.download_manifest.json'
+CHUNK_SIZE = 1 << 20  # 1 MiB reads/writes while streaming and hashing
+
+# Headers to mimic a real browser (Critical for public access later)
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Connection': 'keep-alive',
+}
 
 # Function to calculate MD5 checksum
-def calculate_md5(filepath):
-    """Calculates the MD5 hexdigest of a local file."""
-    hash_md5 = hashlib.md5()
+def calculate_md5(filepath, hash_md5=None):
+    """Calculates the MD5 hexdigest of a local file (optionally continuing `hash_md5`)."""
+    hash_md5 = hash_md5 or hashlib.md5()
     try:
         with open(filepath, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
                 hash_md5.update(chunk)
         return hash_md5.hexdigest()
     except FileNotFoundError:
         return None
 
-def download_figshare_file(code, filename, expected_md5=None, private_link='', token=None, force_download=False):
+class DownloadManifest:
+    """
+    Thread-safe record of verified downloads: {filename: {size, mtime_ns, md5}}.
+
+    A file whose size and mtime still match its entry is trusted without
+    re-hashing it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+
+    def is_verified(self, filename, expected_md5=None):
+        entry = self.entries.get(os.path.basename(filename))
+        if entry is None or not os.path.exists(filename):
+            return False
+        st = os.stat(filename)
+        return (entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns
+                and (expected_md5 is None or entry['md5'] == expected_md5))
+
+    def record(self, filename, md5):
+        st = os.stat(filename)
+        with self.lock:
+            self.entries[os.path.basename(filename)] = {
+                'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'md5': md5}
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self.entries, f, indent=1)
+            os.replace(tmp, self.path)
+
+def make_session(token=None, pool_size=8):
+    """requests.Session with browser headers, optional token and a connection pool."""
+    session = requests.Session()
+    session.headers.update(BROWSER_HEADERS)
+    # Add Token if provided (Critical for private access now)
+    if token:
+        session.headers['Authorization'] = f'token {token}'
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def download_figshare_file(code, filename, expected_md5=None, private_link='', token=None, force_download=False,
+                           session=None, manifest=None, base_url=FIGSHARE_URL, max_retries=5, timeout=60):
     """
     Downloads a file from Figshare using requests.
     Handles redirects and authentication to bypass AWS WAF blocking.
+
+    Bytes are streamed into `<filename>.part` and hashed as they arrive;
+    an interrupted transfer resumes from the partial file with an HTTP
+    Range request. Verified files are recorded in `manifest` so later
+    runs skip re-hashing them. `base_url` can point at any server that
+    serves `<base_url>/<code>` (e.g. a local stand-in).
+    Returns True when `filename` is present (and verified if an MD5 is given).
     """
     # Construct URL with private link if present
-    url = f'https://figshare.com/ndownloader/files/{code}'
+    url = f'{base_url}/{code}'
     params = {}
     if private_link:
         params['private_link'] = private_link
+    session = session or make_session(token)
+    part = filename + '.part'
 
     # 1. Check if file already exists
     if os.path.exists(filename) and not force_download:
+        if manifest is not None and manifest.is_verified(filename, expected_md5):
+            print(f"Valid (manifest): {filename}")
+            return True
         if expected_md5:
             print(f"Verifying existing file: {filename}...")
             local_md5 = calculate_md5(filename)
             if local_md5 == expected_md5:
                 print(f"Valid (MD5 verified): {filename}")
-                return
+                if manifest is not None:
+                    manifest.record(filename, local_md5)
+                return True
             else:
                 print(f"MD5 mismatch for {filename}. Deleting and re-downloading...")
                 os.remove(filename)
         else:
             print(f"{filename} already exists (No MD5 provided).")
-            return
+            return True
+    if force_download:
+        for stale in (filename, part):
+            if os.path.exists(stale):
+                os.remove(stale)
 
     # 2. Download loop
-    max_retries = 5
     attempt = 0
-    
-    # Headers to mimic a real browser (Critical for public access later)
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Connection': 'keep-alive',
-    }
-    
-    # Add Token if provided (Critical for private access now)
-    if token:
-        headers['Authorization'] = f'token {token}'
-
     while attempt < max_retries:
         attempt += 1
-        print(f"Downloading {filename} (Attempt {attempt}/{max_retries})...")
-        
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        hash_md5 = hashlib.md5()
+        if offset:
+            calculate_md5(part, hash_md5)
+            print(f"Resuming {filename} at byte {offset} (Attempt {attempt}/{max_retries})...")
+        else:
+            print(f"Downloading {filename} (Attempt {attempt}/{max_retries})...")
+
         try:
-            # Use requests.get with stream=True
-            with requests.get(url, params=params, headers=headers, stream=True, allow_redirects=True) as r:
-                r.raise_for_status() # Raises error for 403/404
-                
-                # Check for empty content before writing
-                if r.headers.get('Content-Length') == '0':
-                    raise ValueError("Server returned 0 bytes.")
+            headers = {'Range': f'bytes={offset}-'} if offset else {}
+            with session.get(url, params=params, headers=headers, stream=True,
+                             allow_redirects=True, timeout=timeout) as r:
+                if not (offset and r.status_code == 416):  # 416: partial file is already complete
+                    r.raise_for_status() # Raises error for 403/404
+                    if offset and r.status_code != 206:
+                        print("Server ignored the Range request; restarting from byte 0.")
+                        offset, hash_md5 = 0, hashlib.md5()
 
-                with open(filename, 'wb') as f:
-                    shutil.copyfileobj(r.raw, f)
+                    # Check for empty content before writing
+                    if not offset and r.headers.get('Content-Length') == '0':
+                        raise ValueError("Server returned 0 bytes.")
+
+                    with open(part, 'ab' if offset else 'wb') as f:
+                        for chunk in r.iter_content(CHUNK_SIZE):
+                            f.write(chunk)
+                            hash_md5.update(chunk)
 
             # 3. Verify Download
-            if os.path.exists(filename):
-                if os.path.getsize(filename) == 0:
-                     print("Error: File is empty (0 bytes).")
-                     os.remove(filename)
-                     time.sleep(1)
-                     continue
-
-                if expected_md5:
-                    current_md5 = calculate_md5(filename)
-                    if current_md5 == expected_md5:
-                        print(f"Successfully downloaded and verified: {filename}")
-                        return
-                    else:
-                        print(f"MD5 mismatch! Expected {expected_md5}, got {current_md5}.")
-                        # Check for the specific 'empty file' hash
-                        if current_md5 == "d41d8cd98f00b204e9800998ecf8427e":
-                             print("Error: File is effectively empty.")
-                        
-                        print("Deleting corrupt file...")
-                        os.remove(filename)
-                else:
-                    print(f"Successfully downloaded: {filename}")
-                    return
+            if os.path.getsize(part) == 0:
+                print("Error: File is empty (0 bytes).")
+                os.remove(part)
+                time.sleep(1)
+                continue
+
+            current_md5 = hash_md5.hexdigest()
+            if expected_md5 and current_md5 != expected_md5:
+                print(f"MD5 mismatch! Expected {expected_md5}, got {current_md5}.")
+                # Check for the specific 'empty file' hash
+                if current_md5 == "d41d8cd98f00b204e9800998ecf8427e":
+                    print("Error: File is effectively empty.")
+                print("Deleting corrupt file...")
+                os.remove(part)
+                continue
+
+            os.replace(part, filename)
+            if manifest is not None:
+                manifest.record(filename, current_md5)
+            if expected_md5:
+                print(f"Successfully downloaded and verified: {filename}")
             else:
-                print(f"Error: {filename} not found after download.")
+                print(f"Successfully downloaded: {filename}")
+            return True
 
-        except RequestException as e:
+        except requests.exceptions.RequestException as e:
+            # Keep the partial file: the next attempt resumes from it
             print(f"HTTP Error: {e}")
             if "403" in str(e) and not token:
                 print("Hint: 403 Forbidden. Ensure you are passing your 'token' in download_files().")
             time.sleep(1)
         except Exception as e:
             print(f"Download Error: {e}")
-            if os.path.exists(filename):
-                os.remove(filename)
+            if os.path.exists(part):
+                os.remove(part)
             time.sleep(1)
 
     print(f"FAILED to download {filename} after {max_retries} attempts.")
     print("MANUAL DOWNLOAD REQUIRED: If this persists, download the file manually from Figshare and place it in the 'downloads' folder.")
+    return False
 
-def download_files(path_to_repo, files_to_download, private_link=None, token=None, force_download=False):
-    
+def download_files(path_to_repo, files_to_download, private_link=None, token=None, force_download=False,
+                   max_workers=4, download_dir="downloads", base_url=FIGSHARE_URL):
+    """
+    Download the listed files of file_code_mapping.csv, `max_workers` at a time,
+    through one pooled session. Returns {filename: success}.
+    """
     mapping_path = os.path.join(path_to_repo, "file_code_mapping.csv")
     if not os.path.exists(mapping_path):
         print(f"Error: {mapping_path} not found.")
         return
 
     df = pd.read_csv(mapping_path)
-    os.makedirs("downloads", exist_ok=True)
+    os.makedirs(download_dir, exist_ok=True)
 
+    jobs = []
     for _, row in df.iterrows():
         filename = row['File Name']
         if filename not in files_to_download:
@@ -143,23 +237,195 @@ def download_files(path_to_repo, files_to_download, private_link=None, token=Non
                 md5 = val
 
         if code != "" and code.lower() != "nan":
-            full_path = os.path.join("downloads", filename)
-            download_figshare_file(
-                code, 
-                full_path, 
+            jobs.append((filename, code, md5))
+
+    manifest = DownloadManifest(os.path.join(download_dir, MANIFEST_NAME))
+    with make_session(token, pool_size=max(1, max_workers)) as session, \
+            ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {
+            filename: pool.submit(
+                download_figshare_file,
+                code,
+                os.path.join(download_dir, filename),
                 expected_md5=md5,
                 private_link=private_link if private_link is not None else '',
                 token=token,
-                force_download=force_download
+                force_download=force_download,
+                session=session,
+                manifest=manifest,
+                base_url=base_url,
             )
+            for filename, code, md5 in jobs
+        }
+        return {filename: fut.result() for filename, fut in futures.items()}
 
-def unzip(zip_path, extract_path):
+class Archive:
+    """
+    Cached member index of one zip file.
+
+    Opening the same (unchanged) archive again through `open_archive`
+    reuses the parsed central directory, so membership tests and member
+    listings cost a dict lookup instead of a `namelist()` scan.
+
+    `open`, `read_bytes` and `load_*` read through one ZipFile handle per
+    calling thread; `close` (or leaving a `with` block) releases them.
+    `extract` uses its own handles and closes them before returning.
+    """
+
+    def __init__(self, zip_path):
+        self.path = os.fspath(zip_path)
+        with zipfile.ZipFile(self.path, 'r') as zf:
+            self.infos = {info.filename: info for info in zf.infolist()}
+        self._local = threading.local()
+        self._handles = []
+        self._lock = threading.Lock()
+
+    def __contains__(self, name):
+        return name in self.infos
+
+    def members(self, pattern=None):
+        """Member names, optionally filtered with an fnmatch pattern."""
+        names = [n for n in self.infos if not n.endswith('/')]
+        return names if pattern is None else fnmatch.filter(names, pattern)
+
+    def _zf(self, local=None, handles=None):
+        # one handle per thread so parallel reads do not share a file position
+        local = self._local if local is None else local
+        zf = getattr(local, 'zf', None)
+        if zf is None:
+            zf = local.zf = zipfile.ZipFile(self.path, 'r')
+            with self._lock:
+                (self._handles if handles is None else handles).append(zf)
+        return zf
+
+    def close(self):
+        """Close the per-thread handles; the member index stays usable."""
+        with self._lock:
+            handles, self._handles = self._handles, []
+            self._local = threading.local()
+        for zf in handles:
+            zf.close()          # open member streams keep their own reference
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self, name):
+        """File-like object streaming member `name` (decompressed on the fly)."""
+        return self._zf().open(self.infos[name])
+
+    def read_bytes(self, name):
+        return self._zf().read(self.infos[name])
+
+    def _data_offset(self, info):
+        with open(self.path, 'rb') as f:
+            f.seek(info.header_offset)
+            header = f.read(zipfile.sizeFileHeader)
+            fields = struct.unpack(zipfile.structFileHeader, header)
+            name_len = fields[zipfile._FH_FILENAME_LENGTH]
+            extra_len = fields[zipfile._FH_EXTRA_FIELD_LENGTH]
+        return info.header_offset + zipfile.sizeFileHeader + name_len + extra_len
+
+    def load_npy(self, name, mmap=True):
+        """
+        np.load a .npy member without extracting it.
+
+        Stored (uncompressed) members are memory-mapped in place when `mmap`
+        is True; compressed members are decoded from the stream.
+        """
+        info = self.infos[name]
+        if mmap and info.compress_type == zipfile.ZIP_STORED:
+            offset = self._data_offset(info)
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                read_header = {
+                    (1, 0): np.lib.format.read_array_header_1_0,
+                    (2, 0): np.lib.format.read_array_header_2_0,
+                }.get(np.lib.format.read_magic(f))
+                shape, fortran, dtype = read_header(f) if read_header else (None, None, None)
+                if dtype is not None and not dtype.hasobject:
+                    return np.memmap(self.path, dtype=dtype, mode='r', offset=f.tell(),
+                                     shape=shape, order='F' if fortran else 'C')
+        with self.open(name) as f:
+            return np.lib.format.read_array(f, allow_pickle=False)
+
+    def load_pickle(self, name):
+        """Unpickle a member straight from the archive stream."""
+        with self.open(name) as f:
+            return pickle.load(f)
+
+    def _is_current(self, info, target):
+        try:
+            if os.path.getsize(target) != info.file_size:
+                return False
+        except OSError:
+            return False
+        crc = 0
+        with open(target, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                crc = zlib.crc32(chunk, crc)
+        return crc == info.CRC
+
+    def extract(self, extract_path, members=None, workers=4):
+        """
+        Extract `members` (default: all) in parallel, skipping members whose
+        size and CRC already match on disk. Returns the extracted names.
+        """
+        names = self.members() if members is None else list(members)
+        todo = [
+            n for n in names
+            if not self._is_current(self.infos[n], os.path.join(extract_path, *n.split('/')))
+        ]
+        if todo:
+            # zipfile's own makedirs races when two threads share a parent folder
+            for d in {os.path.dirname(os.path.join(extract_path, *n.split('/'))) for n in todo}:
+                os.makedirs(d, exist_ok=True)
+            local, handles = threading.local(), []
+            try:
+                with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                    list(pool.map(
+                        lambda n: self._zf(local, handles).extract(self.infos[n], extract_path),
+                        todo))
+            finally:
+                for zf in handles:
+                    zf.close()
+        return todo
+
+_ARCHIVES = {}
+
+def open_archive(zip_path):
+    """Archive for `zip_path`, re-parsed only when the file's size or mtime changes."""
+    path = os.path.abspath(os.fspath(zip_path))
+    st = os.stat(path)
+    key = (st.st_size, st.st_mtime_ns)
+    cached = _ARCHIVES.get(path)
+    if cached is None or cached[0] != key:
+        if cached is not None:
+            cached[1].close()
+        cached = _ARCHIVES[path] = (key, Archive(path))
+    return cached[1]
+
+def is_in_zip(zip_path, filename):
+    """Membership test backed by the cached member index."""
+    return os.path.exists(zip_path) and filename in open_archive(zip_path)
+
+def unzip(zip_path, extract_path, members=None, workers=4):
+    """
+    Extract `zip_path` into `extract_path`.
+
+    Only members that are missing or differ (size/CRC) on disk are written,
+    so re-running a notebook does not re-extract multi-GB archives.
+    """
     print(f"Unzipping {zip_path}...")
     try:
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_path)
-        print("Unzip successful.")
+        written = open_archive(zip_path).extract(extract_path, members=members, workers=workers)
+        print(f"Unzip successful ({len(written)} members extracted, others already up to date).")
     except zipfile.BadZipFile:
         print(f"Error: {zip_path} is not a valid zip file.")
     except FileNotFoundError:
         print(f"Error: {zip_path} not found.")
+
+
+instrument_module(globals())
@@ -0,0 +1,180 @@
+# utils/feature_store.py
+"""
+feature_store.py
+
+Memory-mapped store for the DNN features exported by dnn_features_extraction.
+It includes:
+  - A one-time conversion of `*_features_*.pkl` blobs ({"penultimate",
+    "image_names"}) into per-network .npy arrays in their original dtype
+    (fp16 stays fp16), flattened to (n_images, n_features)
+  - A persisted row-ordered name list per network, turned into a hash
+    index on first use, so stimuli are aligned by lookup instead of
+    `names.index(b)` scans
+  - Lazy opening and a vectorized `take(names)` that gathers only the
+    requested rows from the memory map
+
+Layout on disk:
+    root/<key>.npy         features, (n_images, n_features)
+    root/<key>.json        {"names": [...], "shape", "dtype", "fingerprint"}
+"""
+
+import os
+import json
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.session_store import file_fingerprint
+
+
+class FeatureArray:
+    """
+    Lazily opened features of one network.
+
+    Attributes
+    ----------
+    key : str
+    names : list of str
+        Image names in row order, as stored in the source pickle.
+    shape, dtype
+        Shape and dtype of the stored (n_images, n_features) array.
+    """
+
+    def __init__(self, root, key):
+        self.key = key
+        self._npy = os.path.join(root, f"{key}.npy")
+        with open(os.path.join(root, f"{key}.json")) as f:
+            meta = json.load(f)
+        self.names = meta["names"]
+        self.shape = tuple(meta["shape"])
+        self.dtype = np.dtype(meta["dtype"])
+        self._array = None
+        self._index = {}
+
+    @property
+    def array(self):
+        """Memory-mapped (n_images, n_features) view; nothing is read until indexed."""
+        if self._array is None:
+            self._array = np.load(self._npy, mmap_mode="r")
+        return self._array
+
+    def _lookup(self, stem):
+        if stem not in self._index:
+            keys = pd.Index([Path(n).stem for n in self.names] if stem else self.names)
+            # repeated names resolve to their first row, as `names.index(b)` does
+            first = np.flatnonzero(~keys.duplicated(keep="first"))
+            self._index[stem] = (keys[first], first)
+        return self._index[stem]
+
+    def index(self, stem=True):
+        """
+        Hash index over image names (file stems by default, as in the
+        notebooks); a name stored more than once keeps only its first row.
+        """
+        return self._lookup(stem)[0]
+
+    def rows(self, names, stem=True, missing="raise"):
+        """
+        Row numbers of `names`; with missing="drop" absent names are skipped
+        and the second return value flags which of `names` were found.
+        """
+        index, first = self._lookup(stem)
+        pos = index.get_indexer(pd.Index(names))
+        found = pos >= 0
+        rows = np.where(found, first[pos], -1)
+        if missing == "raise" and not found.all():
+            absent = np.asarray(names, dtype=object)[~found][:5]
+            raise KeyError(f"{self.key}: {int((~found).sum())} names not found, e.g. {list(absent)}")
+        return rows[found], found
+
+    def take(self, names, stem=True, missing="raise", dtype=None):
+        """
+        Feature rows aligned to `names`, gathered from the memory map.
+
+        Parameters
+        ----------
+        names : sequence of str
+            Requested stimuli, in the desired output order.
+        stem : bool, optional
+            Match on file stems (Path(name).stem) rather than raw names.
+        missing : {"raise", "drop"}, optional
+            What to do with names that are not in the store.
+        dtype : numpy dtype, optional
+            Cast the gathered rows (e.g. np.float64 for sklearn).
+        """
+        rows, _ = self.rows(names, stem=stem, missing=missing)
+        order = np.argsort(rows, kind="stable")
+        out = np.empty((rows.size, self.shape[1]), dtype=self.array.dtype)
+        out[order] = self.array[rows[order]]     # sorted reads are page-friendly
+        return out if dtype is None else out.astype(dtype, copy=False)
+
+
+class FeatureStore:
+    """
+    Directory of converted per-network feature arrays.
+
+    Parameters
+    ----------
+    root : str
+        Store directory; created if missing.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._open = {}
+
+    @property
+    def keys(self):
+        return sorted(f[:-5] for f in os.listdir(self.root) if f.endswith(".json"))
+
+    def __contains__(self, key):
+        return os.path.exists(os.path.join(self.root, f"{key}.json"))
+
+    def convert(self, pkl_path, key=None, force=False):
+        """
+        Convert one features pickle; skipped when the pickle is unchanged.
+
+        Returns the store key (the pickle stem by default).
+        """
+        key = key or Path(pkl_path).stem
+        meta_path = os.path.join(self.root, f"{key}.json")
+        fingerprint = file_fingerprint([pkl_path])
+        if not force and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                if json.load(f).get("fingerprint") == fingerprint:
+                    return key
+
+        with open(pkl_path, "rb") as fh:
+            d = pickle.load(fh)
+        X = np.asarray(d["penultimate"])
+        X = X.reshape(X.shape[0], -1)
+        names = [str(n) for n in d["image_names"]]
+        if len(names) != X.shape[0]:
+            raise ValueError(f"{pkl_path}: {len(names)} names for {X.shape[0]} rows")
+
+        tmp = os.path.join(self.root, f"{key}.tmp.npy")
+        np.save(tmp, X)
+        os.replace(tmp, os.path.join(self.root, f"{key}.npy"))
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({"names": names, "shape": list(X.shape), "dtype": X.dtype.str,
+                       "fingerprint": fingerprint, "source": os.path.basename(pkl_path)}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        self._open.pop(key, None)
+        return key
+
+    def convert_dir(self, feature_dir, pattern="*_features_*.pkl"):
+        """Convert every matching pickle of `feature_dir`; returns the keys."""
+        return [self.convert(p) for p in sorted(Path(feature_dir).glob(pattern))]
+
+    def open(self, key):
+        """Lazily opened FeatureArray for `key` (cached per store)."""
+        if key not in self._open:
+            self._open[key] = FeatureArray(self.root, key)
+        return self._open[key]
+
+    def take(self, key, names, **kwargs):
+        """Shorthand for `store.open(key).take(names, **kwargs)`."""
+        return self.open(key).take(names, **kwargs)
@@ -4,9 +4,11 @@ image_processing.py
 
 This module contains utility functions for processing visual stimuli.
 It includes:
-  - A function to simulate the magnocellular pathway (Gaussian low-pass filtering)
+  - A function to simulate the magnocellular pathway (Gaussian low-pass filtering),
+    with a cached real-FFT transfer function and support for image stacks
   - A function to compute the radial average of an FFT magnitude spectrum
-  - A function to process a folder of images: apply the filter and save outputs
+  - A function to process a folder of images in a process pool: apply the filter
+    and save uint8 outputs
   - Functions to compute and plot radial frequency spectra from original and filtered images
 
 These utilities are useful in time-resolved representational geometry analyses
@@ -14,16 +16,33 @@ of ventral stream data.
 """
 
 import os
+import inspect
+from functools import lru_cache, partial
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import cv2
-import matplotlib.pyplot as plt
 
-def m_pathway_filter_gaussian(image,
-                              cutoff_cpd     = 0.5,   # desired cut-off in cycles/degree
-                              fov_deg        = 8.0,   # image spans this many degrees
-                              atten_dB_at_cut = -20):  # attenuation (dB) at cutoff
+from utils.instrumentation import instrument_module
+from utils.lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+plt = lazy_import("matplotlib.pyplot")
+
+@lru_cache(maxsize=32)
+def gaussian_transfer_function(shape, cutoff_cpd=0.5, fov_deg=8.0, atten_dB_at_cut=-20):
     """
-    Gaussian low-pass that is attenuated by `atten_dB_at_cut`
+    Cached isotropic Gaussian low-pass in real-FFT (rfft2) layout.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        (rows, cols) of the images.
+    cutoff_cpd, fov_deg, atten_dB_at_cut : float
+        See `m_pathway_filter_gaussian`.
+
+    Returns
+    -------
+    H : ndarray of float32, shape (rows, cols // 2 + 1)
+        Read-only transfer function, shared by every call with the same key.
     """
     # 1) convert to cycles per image width
     cutoff_cycles = cutoff_cpd * fov_deg
@@ -34,24 +53,48 @@ def m_pathway_filter_gaussian(image,
     # 3) solve σ so that exp(–(cutoff_cycles)^2/(2σ^2)) == gain
     sigma = cutoff_cycles / np.sqrt(-2 * np.log(gain))
 
-    # 4) forward FFT (no fftshift)
-    F = np.fft.fft2(image)
-
-    # 5) build frequency grid (in cycles per image)
-    rows, cols = image.shape
+    # 4) frequency grid (in cycles per image); rfft keeps the non-negative columns
+    rows, cols = shape
     row_freqs = np.fft.fftfreq(rows) * rows
-    col_freqs = np.fft.fftfreq(cols) * cols
-    U, V = np.meshgrid(col_freqs, row_freqs)
-    D = np.sqrt(U**2 + V**2)
+    col_freqs = np.fft.rfftfreq(cols) * cols
+    D2 = col_freqs[None, :]**2 + row_freqs[:, None]**2
+
+    H = np.exp(-D2 / (2 * sigma**2)).astype(np.float32)
+    H.flags.writeable = False
+    return H
+
+def m_pathway_filter_gaussian(image,
+                              cutoff_cpd     = 0.5,   # desired cut-off in cycles/degree
+                              fov_deg        = 8.0,   # image spans this many degrees
+                              atten_dB_at_cut = -20):  # attenuation (dB) at cutoff
+    """
+    Gaussian low-pass that is attenuated by `atten_dB_at_cut`
 
-    # 6) isotropic Gaussian low-pass
-    H = np.exp(-(D**2) / (2 * sigma**2))
+    `image` may be a single (rows, cols) image or a stack (..., rows, cols);
+    it is filtered in float32 with real FFTs and the cached transfer
+    function. Returns float32 of the same shape (see `to_uint8`).
+    """
+    image = np.asarray(image, dtype=np.float32)
+    shape = image.shape[-2:]
+    H = gaussian_transfer_function(tuple(shape), cutoff_cpd, fov_deg, atten_dB_at_cut)
+    F = np.fft.rfft2(image)
+    F *= H
+    return np.fft.irfft2(F, s=shape).astype(np.float32, copy=False)
 
-    # 7) apply filter and inverse FFT
-    Filt = F * H
-    image_filtered = np.fft.ifft2(Filt).real
+def to_uint8(image):
+    """Clip to [0, 255] and truncate to uint8, as the stimulus notebooks do before imwrite."""
+    return np.clip(image, 0, 255).astype(np.uint8)
 
-    return image_filtered
+@lru_cache(maxsize=16)
+def _shifted_radial_index(rows, cols):
+    """Integer radius of every fftshift-ed coefficient and the count per radius."""
+    cy, cx = rows // 2, cols // 2
+    y, x = np.indices((rows, cols))
+    r = np.sqrt((x - cx)**2 + (y - cy)**2).astype(int).ravel()
+    radial_count = np.bincount(r)
+    radial_count[radial_count == 0] = 1  # avoid division by zero
+    r.flags.writeable = radial_count.flags.writeable = False
+    return r, radial_count
 
 def radial_average_vectorized(magnitude_spectrum, visual_angle=8):
     """
@@ -72,19 +115,46 @@ def radial_average_vectorized(magnitude_spectrum, visual_angle=8):
         The spatial frequency axis (cycles per degree), linearly spaced.
     """
     rows, cols = magnitude_spectrum.shape[-2:]
-    cy, cx = rows // 2, cols // 2
-    y, x = np.indices((rows, cols))
-    r = np.sqrt((x - cx)**2 + (y - cy)**2).astype(int)
+    r, radial_count = _shifted_radial_index(rows, cols)
     
-    radial_sum = np.bincount(r.ravel(), weights=magnitude_spectrum.ravel())
-    radial_count = np.bincount(r.ravel())
-    radial_count[radial_count == 0] = 1  # avoid division by zero
+    radial_sum = np.bincount(r, weights=magnitude_spectrum.ravel(), minlength=radial_count.size)
     
     radial_avg = radial_sum / radial_count
     cpd = np.linspace(0, (rows // 2) / visual_angle, len(radial_avg))
     return radial_avg, cpd
 
-def process_and_filter_images(stimulus_folder, output_folder, filter_func=m_pathway_filter_gaussian):
+def _list_images(folder):
+    return sorted([f for f in os.listdir(folder)
+                   if f.lower().endswith(('.png', '.jpg', '.jpeg'))])
+
+def _filter_files(pairs, filter_func, stack):
+    """Worker: decode a chunk of files, filter same-shape stacks, encode uint8."""
+    images = []
+    for src, dst in pairs:
+        img = cv2.imread(src, cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            images.append((dst, img))
+    if stack:
+        groups = {}
+        for dst, img in images:
+            groups.setdefault(img.shape, []).append((dst, img))
+        for group in groups.values():
+            filtered = filter_func(np.stack([img for _, img in group]))
+            for (dst, _), out in zip(group, filtered):
+                cv2.imwrite(dst, to_uint8(out))
+    else:
+        for dst, img in images:
+            cv2.imwrite(dst, to_uint8(filter_func(img)))
+    return len(images)
+
+def _stacks_images(filter_func):
+    """True for m_pathway_filter_gaussian or a partial of it, the one filter known to take stacks."""
+    while isinstance(filter_func, partial):
+        filter_func = filter_func.func
+    return inspect.unwrap(filter_func) is inspect.unwrap(m_pathway_filter_gaussian)
+
+def process_and_filter_images(stimulus_folder, output_folder, filter_func=None,
+                              workers=None, chunk_size=64, stack=None):
     """
     Process images from the stimulus folder by applying the specified filter
     and saving the filtered images to the output folder.
@@ -96,25 +166,46 @@ def process_and_filter_images(stimulus_folder, output_folder, filter_func=m_path
     output_folder : str
         Path where filtered images will be saved.
     filter_func : callable, optional
-        The filtering function to apply. Defaults to m_pathway_filter_gaussian.
+        The filtering function to apply. Defaults to m_pathway_filter_gaussian,
+        looked up at call time (so the profiled wrapper is used when on).
+        Must be picklable (module-level) when `workers` > 1.
+    workers : int, optional
+        Size of the process pool decoding, filtering and encoding chunks of
+        files (default: os.cpu_count()); 1 runs in-process.
+    chunk_size : int, optional
+        Number of files handled per task.
+    stack : bool, optional
+        Call `filter_func` on (n, rows, cols) stacks of same-shape images.
+        By default only m_pathway_filter_gaussian (or a functools.partial of
+        it) is stacked; any other filter gets one 2-D image per call unless
+        stack=True is passed.
+
+    Outputs are written as uint8 through `to_uint8`.
     """
+    if filter_func is None:
+        filter_func = m_pathway_filter_gaussian
     os.makedirs(output_folder, exist_ok=True)
-    image_files = sorted([f for f in os.listdir(stimulus_folder)
-                          if f.lower().endswith(('.png', '.jpg', '.jpeg'))])
-    
-    for img_name in image_files:
-        img_path = os.path.join(stimulus_folder, img_name)
-        output_path = os.path.join(output_folder, img_name)
-        img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-        if img is None:
-            continue
-        filtered_img = filter_func(img)
-        cv2.imwrite(output_path, filtered_img)
-    print(f"Processed {len(image_files)} images from {stimulus_folder} and saved to {output_folder}.")
+    image_files = _list_images(stimulus_folder)
+    pairs = [(os.path.join(stimulus_folder, f), os.path.join(output_folder, f)) for f in image_files]
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    workers = workers or os.cpu_count() or 1
+    if stack is None:
+        stack = _stacks_images(filter_func)
+
+    if workers == 1 or len(chunks) <= 1:
+        n_done = sum(_filter_files(c, filter_func, stack) for c in chunks)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            n_done = sum(pool.map(_filter_files, chunks,
+                                  [filter_func] * len(chunks), [stack] * len(chunks)))
+    print(f"Processed {n_done} images from {stimulus_folder} and saved to {output_folder}.")
 
 def compute_radial_spectra(stimulus_folder, output_folder, visual_angle=8, epsilon=1e-8):
     """
     Compute the radial spectra (log magnitude) for both original and filtered images.
+
+    Each image gets one real FFT with a cached radial-bin index, and the
+    mean/SEM are accumulated in streaming fashion (see utils.spectral).
     
     Parameters
     ----------
@@ -140,40 +231,9 @@ def compute_radial_spectra(stimulus_folder, output_folder, visual_angle=8, epsil
     sem_filt : ndarray
         Standard error of the mean for the filtered images.
     """
-    image_files = sorted([f for f in os.listdir(stimulus_folder)
-                          if f.lower().endswith(('.png', '.jpg', '.jpeg'))])
-    orig_log_radial_list = []
-    filt_log_radial_list = []
-    cpd = None
-
-    for img_name in image_files:
-        original_path = os.path.join(stimulus_folder, img_name)
-        filtered_path = os.path.join(output_folder, img_name)
-        original_img = cv2.imread(original_path, cv2.IMREAD_GRAYSCALE)
-        filtered_img = cv2.imread(filtered_path, cv2.IMREAD_GRAYSCALE)
-        if original_img is None or filtered_img is None:
-            continue
-        
-        original_fft = np.fft.fftshift(np.fft.fft2(original_img))
-        filtered_fft = np.fft.fftshift(np.fft.fft2(filtered_img))
-        original_magnitude = np.abs(original_fft)
-        filtered_magnitude = np.abs(filtered_fft)
-        
-        original_avg, cpd = radial_average_vectorized(original_magnitude, visual_angle)
-        filtered_avg, _ = radial_average_vectorized(filtered_magnitude, visual_angle)
-        
-        orig_log_radial_list.append(np.log(original_avg + epsilon))
-        filt_log_radial_list.append(np.log(filtered_avg + epsilon))
-    
-    orig_log_radial = np.array(orig_log_radial_list)
-    filt_log_radial = np.array(filt_log_radial_list)
-    
-    mean_orig = np.mean(orig_log_radial, axis=0)
-    mean_filt = np.mean(filt_log_radial, axis=0)
-    sem_orig = np.std(orig_log_radial, axis=0, ddof=1) / np.sqrt(orig_log_radial.shape[0])
-    sem_filt = np.std(filt_log_radial, axis=0, ddof=1) / np.sqrt(filt_log_radial.shape[0])
-    
-    return cpd, mean_orig, sem_orig, mean_filt, sem_filt
+    from utils.spectral import folder_radial_spectra  # spectral builds on this module
+
+    return folder_radial_spectra(stimulus_folder, output_folder, visual_angle, epsilon)
 
 def plot_radial_spectra(cpd, mean_orig, sem_orig, mean_filt, sem_filt, title="Mean Frequency Spectrum ± SEM"):
     """
@@ -205,6 +265,8 @@ def plot_radial_spectra(cpd, mean_orig, sem_orig, mean_filt, sem_filt, title="Me
     plt.legend()
     plt.show()
 
+instrument_module(globals())
+
 # Optional: You can add an __main__ block here for basic testing.
 if __name__ == "__main__":
     # Example usage with a small folder of images.
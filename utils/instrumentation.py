@@ -0,0 +1,235 @@
+# utils/instrumentation.py
+"""
+instrumentation.py
+
+Opt-in timing of the utils entry points and of notebook stages.
+It includes:
+  - `timer(stage)`, a context manager, and `timed`, a decorator, that add
+    wall time (and, in memory mode, the tracemalloc peak above the entry
+    level) to a per-stage table
+  - `instrument_module`, called at the bottom of analysis_utils,
+    image_processing, extract_and_download_data and decoding, which wraps
+    their public functions when profiling is on
+  - JAX compile time, collected as the "jax.compile" stage from
+    jax.monitoring events once jax has been imported (by utils.kernels or
+    the notebook); profiling never imports jax itself
+  - `report`, `print_report` and `write_report` (JSON or CSV) of calls,
+    total/mean/max time and peak MB per stage
+
+Profiling is switched on by the environment variable UTILS_PROFILE
+("1" for timers, "mem" for timers plus tracemalloc peaks) before the utils
+modules are imported. When it is off the modules are left untouched and
+`timer` returns a shared no-op context, so the cost is one attribute check.
+Set UTILS_PROFILE_OUT=<path.json|path.csv> to write the table at exit.
+
+Stage times are inclusive: a wrapped function that calls another wrapped
+function counts the inner time in both rows. Work done in worker processes
+(process pools) is not collected.
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import atexit
+import inspect
+import threading
+import functools
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+PROFILE_ENV = "UTILS_PROFILE"
+OUTPUT_ENV = "UTILS_PROFILE_OUT"
+
+_mode = os.environ.get(PROFILE_ENV, "").strip().lower()
+enabled = _mode not in ("", "0", "false", "off", "no")
+track_memory = _mode in ("mem", "memory")
+
+_stats = {}
+_lock = threading.Lock()
+_local = threading.local()
+_NOOP = nullcontext()
+_jax_hooked = False
+
+
+def _record(stage, elapsed, peak=None):
+    with _lock:
+        s = _stats.setdefault(stage, {"calls": 0, "total_s": 0.0, "max_s": 0.0, "peak_bytes": None})
+        s["calls"] += 1
+        s["total_s"] += elapsed
+        s["max_s"] = max(s["max_s"], elapsed)
+        if peak is not None:
+            s["peak_bytes"] = max(s["peak_bytes"] or 0, peak)
+
+
+@contextmanager
+def _timed_block(stage):
+    if not _jax_hooked and "jax" in sys.modules:
+        hook_jax()
+    frames = getattr(_local, "frames", None)
+    if frames is None:
+        frames = _local.frames = []
+    mem = track_memory
+    if mem:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        cur, peak = tracemalloc.get_traced_memory()
+        if frames:
+            frames[-1]["floor"] = max(frames[-1]["floor"], peak)
+        tracemalloc.reset_peak()
+        frames.append({"base": cur, "floor": 0})
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        peak = None
+        if mem:
+            _, p = tracemalloc.get_traced_memory()
+            frame = frames.pop()
+            top = max(p, frame["floor"])
+            peak = top - frame["base"]
+            if frames:
+                frames[-1]["floor"] = max(frames[-1]["floor"], top)
+        _record(stage, elapsed, peak)
+
+
+def timer(stage):
+    """
+    Time a block as `stage` when profiling is on.
+
+        with timer("geometry.load_features"):
+            X = load_and_align(...)
+    """
+    return _timed_block(stage) if enabled else _NOOP
+
+
+def timed(stage=None):
+    """
+    Decorator form of `timer`; the stage defaults to "<module>.<function>".
+
+    When profiling is off at decoration time the function is returned as is.
+    """
+    def decorate(func):
+        if not enabled:
+            return func
+        name = stage or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _timed_block(name):
+                return func(*args, **kwargs)
+        wrapper.__wrapped_stage__ = name
+        return wrapper
+    if callable(stage):                      # used as @timed without arguments
+        func, stage = stage, None
+        return decorate(func)
+    return decorate
+
+
+def instrument_module(namespace):
+    """
+    Wrap the public functions defined in a module (pass its `globals()`).
+
+    Calls between functions of the module go through the module globals, so
+    nested entry points show up as their own stages. Argument defaults that
+    point at a wrapped function (e.g. `filter_func=m_pathway_filter_gaussian`)
+    are redirected to the wrapper, which is what pickles by name.
+    """
+    if not enabled:
+        return
+    if "jax" in sys.modules:
+        hook_jax()
+    module = namespace["__name__"]
+    replaced = {}
+    for name, obj in list(namespace.items()):
+        if (name.startswith("_") or not inspect.isfunction(obj)
+                or obj.__module__ != module or hasattr(obj, "__wrapped_stage__")):
+            continue
+        namespace[name] = replaced[id(obj)] = timed(obj)
+    for obj in list(namespace.values()):
+        func = getattr(obj, "__wrapped__", obj)
+        if not inspect.isfunction(func) or func.__module__ != module:
+            continue
+        if func.__defaults__:
+            func.__defaults__ = tuple(replaced.get(id(d), d) for d in func.__defaults__)
+        if func.__kwdefaults__:
+            func.__kwdefaults__ = {k: replaced.get(id(d), d) for k, d in func.__kwdefaults__.items()}
+
+
+def hook_jax():
+    """
+    Collect JAX compilation time (trace, lowering, backend compile) once.
+
+    Called when jax is already imported: by `instrument_module`, on entry to
+    a timed stage, and by utils.kernels after it imports jax.
+    """
+    global _jax_hooked
+    if _jax_hooked or not enabled:
+        return
+    _jax_hooked = True
+    try:
+        from jax import monitoring
+    except ImportError:
+        return
+
+    def listener(event, duration, **kwargs):
+        if event.startswith("/jax/core/compile/"):
+            _record("jax.compile", duration)
+
+    monitoring.register_event_duration_secs_listener(listener)
+
+
+def reset():
+    """Clear the collected stages."""
+    with _lock:
+        _stats.clear()
+
+
+def report():
+    """Per-stage rows sorted by total time (descending)."""
+    with _lock:
+        items = [(k, dict(v)) for k, v in _stats.items()]
+    rows = []
+    for stage, s in items:
+        rows.append({
+            "stage": stage,
+            "calls": s["calls"],
+            "total_s": s["total_s"],
+            "mean_s": s["total_s"] / s["calls"],
+            "max_s": s["max_s"],
+            "peak_mb": None if s["peak_bytes"] is None else s["peak_bytes"] / 2**20,
+        })
+    return sorted(rows, key=lambda r: r["total_s"], reverse=True)
+
+
+def print_report(top=None):
+    """Print the per-stage table (optionally only the `top` stages)."""
+    rows = report()[:top]
+    if not rows:
+        print(f"No stages recorded (set {PROFILE_ENV}=1 before importing utils).")
+        return
+    print(f"{'stage':<48s} {'calls':>7s} {'total s':>10s} {'mean ms':>10s} {'peak MB':>9s}")
+    for r in rows:
+        peak = "" if r["peak_mb"] is None else f"{r['peak_mb']:.1f}"
+        print(f"{r['stage']:<48s} {r['calls']:>7d} {r['total_s']:>10.3f} "
+              f"{r['mean_s'] * 1e3:>10.2f} {peak:>9s}")
+
+
+def write_report(path):
+    """Write the per-stage table as JSON or CSV (by file extension)."""
+    rows = report()
+    if path.lower().endswith(".csv"):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["stage", "calls", "total_s", "mean_s", "max_s", "peak_mb"])
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, "w") as f:
+            json.dump({"mode": _mode, "stages": rows}, f, indent=1)
+    return path
+
+
+if enabled and os.environ.get(OUTPUT_ENV):
+    atexit.register(write_report, os.environ[OUTPUT_ENV])
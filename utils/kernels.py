@@ -0,0 +1,238 @@
+# utils/kernels.py
+"""
+kernels.py
+
+Shared registry of compiled JAX kernels.
+It includes:
+  - `Kernel`, which pads its array arguments up to shape buckets and keeps
+    one ahead-of-time compiled executable per bucket in-process, so new
+    batch sizes or feature widths (~50 networks) reuse a handful of
+    compilations instead of retracing per shape
+  - `bucket`, the padding rule: sizes are rounded up to a multiple of a
+    quarter of their power-of-two octave (at most 25% padding)
+  - `enable_persistent_cache`, which points JAX's on-disk compilation cache
+    at $UTILS_JAX_CACHE_DIR (default ~/.cache/utils-jax) on first compile,
+    so a fresh notebook kernel loads executables instead of compiling them
+  - `stats`, per-kernel compile / execute counters and compile seconds
+  - the registered kernels: `pairwise_sqeuclidean` (condensed squared
+    distances of one or many batches), `pw_euclid` (drop-in for the
+    notebooks' `make_pw_euclid`) and `sqeucl` (row-wise mean squared
+    distance to a template)
+
+Zero padding leaves every result unchanged: padded features add nothing to
+squared distances, padded rows and batches are sliced off, and means are
+taken over the true feature count.
+"""
+
+import os
+import time
+import threading
+
+import numpy as np
+import jax
+import jax.numpy as jnp
+
+from utils.instrumentation import hook_jax
+
+CACHE_ENV = "UTILS_JAX_CACHE"
+CACHE_DIR_ENV = "UTILS_JAX_CACHE_DIR"
+
+REGISTRY = {}
+_lock = threading.Lock()
+_persistent = None
+
+hook_jax()
+
+
+def bucket(n, minimum=8):
+    """Smallest bucket size >= n: a multiple of max(minimum, 2**floor(log2(n-1)) / 4)."""
+    n = int(n)
+    if n <= minimum:
+        return minimum
+    step = max(minimum, 1 << ((n - 1).bit_length() - 3))
+    return -(-n // step) * step
+
+
+def enable_persistent_cache(path=None, min_compile_time_secs=0.0):
+    """
+    Turn on JAX's on-disk compilation cache (once per process).
+
+    Leaves an already configured `jax_compilation_cache_dir` alone and does
+    nothing when UTILS_JAX_CACHE=0. Returns the cache directory or None.
+    """
+    global _persistent
+    if _persistent is not None and path is None:
+        return _persistent or None
+    if os.environ.get(CACHE_ENV, "1").strip().lower() in ("0", "false", "off", "no"):
+        _persistent = ""
+        return None
+    current = jax.config.jax_compilation_cache_dir
+    if current and path is None:
+        _persistent = current
+        return current
+    path = path or os.environ.get(CACHE_DIR_ENV) or os.path.join(
+        os.path.expanduser("~"), ".cache", "utils-jax")
+    os.makedirs(path, exist_ok=True)
+    jax.config.update("jax_compilation_cache_dir", path)
+    jax.config.update("jax_persistent_cache_min_compile_time_secs", min_compile_time_secs)
+    _persistent = path
+    return path
+
+
+class Kernel:
+    """
+    A jittable function compiled once per padded shape bucket.
+
+    Parameters
+    ----------
+    name : str
+    fn : callable
+        Pure JAX function of array arguments.
+    pad : sequence
+        Per positional argument, the axes to pad up to `bucket` sizes
+        (an empty tuple for arguments passed through unpadded).
+
+    Calling the kernel returns the padded output as a NumPy array; the
+    public wrappers below slice it back to the true shape.
+    """
+
+    def __init__(self, name, fn, pad):
+        self.name = name
+        self.fn = fn
+        self.pad = tuple(tuple(axes) for axes in pad)
+        self.executables = {}
+        self.compiles = 0
+        self.executions = 0
+        self.compile_s = 0.0
+
+    def padded(self, *args):
+        out = []
+        for a, axes in zip(args, self.pad):
+            a = np.asarray(a)
+            if axes:
+                axes = {ax % a.ndim for ax in axes}
+                widths = [(0, bucket(a.shape[ax]) - a.shape[ax]) if ax in axes else (0, 0)
+                          for ax in range(a.ndim)]
+                if any(w for _, w in widths):
+                    a = np.pad(a, widths)
+            out.append(a)
+        return out
+
+    def executable(self, args):
+        key = tuple((a.shape, a.dtype.str) for a in args)
+        exe = self.executables.get(key)
+        if exe is None:
+            with _lock:
+                exe = self.executables.get(key)
+                if exe is None:
+                    enable_persistent_cache()
+                    t0 = time.perf_counter()
+                    exe = jax.jit(self.fn).lower(*args).compile()
+                    self.compile_s += time.perf_counter() - t0
+                    self.compiles += 1
+                    self.executables[key] = exe
+        return exe
+
+    def __call__(self, *args):
+        args = self.padded(*args)
+        out = self.executable(args)(*args)
+        self.executions += 1
+        return np.asarray(out)
+
+
+def register(name, pad):
+    """Decorator adding a JAX function to the registry as a `Kernel`."""
+    def wrap(fn):
+        REGISTRY[name] = Kernel(name, fn, pad)
+        return fn
+    return wrap
+
+
+def get(name):
+    return REGISTRY[name]
+
+
+def stats():
+    """{name: {"compiles", "executions", "compile_s", "buckets"}} of every kernel."""
+    return {k.name: {"compiles": k.compiles, "executions": k.executions,
+                     "compile_s": k.compile_s, "buckets": sorted(k.executables, key=str)}
+            for k in REGISTRY.values()}
+
+
+def reset_stats():
+    for k in REGISTRY.values():
+        k.compiles = k.executions = 0
+        k.compile_s = 0.0
+
+
+def clear():
+    """Drop the in-process executables (the on-disk cache is kept)."""
+    for k in REGISTRY.values():
+        k.executables.clear()
+
+
+# ---------------------------------------------------------------------------
+# Kernels
+# ---------------------------------------------------------------------------
+@register("sqdist_gram_batched", pad=[(0, 1, 2)])
+@register("sqdist_gram", pad=[(0, 1)])
+def _sqdist_gram(X):
+    """(..., n, n) squared distances from ||x||² + ||y||² - 2 x·y."""
+    sq = jnp.sum(X * X, axis=-1)
+    gram = X @ jnp.swapaxes(X, -1, -2)
+    return jnp.maximum(sq[..., :, None] + sq[..., None, :] - 2 * gram, 0)
+
+
+@register("sqdist_diff_batched", pad=[(0, 1, 2)])
+@register("sqdist_diff", pad=[(0, 1)])
+def _sqdist_diff(X):
+    """(..., n, n) squared distances from explicit differences (as make_pw_euclid)."""
+    diff = X[..., :, None, :] - X[..., None, :, :]
+    return jnp.sum(diff ** 2, axis=-1)
+
+
+@register("sqeucl", pad=[(0, 1), (0,), ()])
+def _sqeucl(mat, vec, n_features):
+    return jnp.sum((mat - vec) ** 2, axis=1) / n_features
+
+
+def pairwise_sqeuclidean(X, i_upper=None, j_upper=None, method="gram"):
+    """
+    Condensed squared Euclidean distances of (n, d) rows, or of each batch
+    of a (B, n, d) stack -> (n_pairs,) or (B, n_pairs).
+
+    `i_upper`, `j_upper` default to `np.triu_indices(n, 1)`. method="gram"
+    expands ||x||² + ||y||² - 2 x·y (one matrix product; in float32 it
+    loses the distance of near-duplicate rows with large norms), "diff"
+    sums explicit squared differences (n * n * d memory, accurate).
+    """
+    if method not in ("gram", "diff"):
+        raise ValueError(f"Unknown method {method!r}")
+    X = np.asarray(X)
+    n = X.shape[-2]
+    if i_upper is None:
+        i_upper, j_upper = np.triu_indices(n, 1)
+    name = f"sqdist_{method}"
+    if X.ndim == 3:
+        return REGISTRY[name + "_batched"](X)[:X.shape[0], i_upper, j_upper]
+    return REGISTRY[name](X)[i_upper, j_upper]
+
+
+def pw_euclid(batch):
+    """
+    Registry-backed replacement for the notebooks' `make_pw_euclid(batch)`:
+    condensed squared distances of a (batch, d) array by explicit differences.
+    """
+    iu, ju = np.triu_indices(batch, 1)
+    kernel = REGISTRY["sqdist_diff"]
+
+    def pw(X):
+        return kernel(X)[iu, ju]
+    return pw
+
+
+def sqeucl(mat, vec):
+    """Row-wise mean squared distance of `mat` (n, d) to `vec` (d,)."""
+    mat = np.asarray(mat)
+    d = np.asarray(mat.shape[1], dtype=mat.dtype if mat.dtype.kind == "f" else np.float32)
+    return REGISTRY["sqeucl"](mat, vec, d)[:mat.shape[0]]
@@ -0,0 +1,62 @@
+# utils/lazy.py
+"""
+lazy.py
+
+Deferred imports for the heavy optional dependencies of `utils`.
+It includes:
+  - `lazy_import(name)`, a module stand-in that imports `name` on first
+    attribute access, so `cv2 = lazy_import("cv2")` at module level costs
+    nothing until a function actually calls `cv2.imread`
+  - `IMPORT_BUDGET`, the documented import-time budget of the lightweight
+    entry points, checked by `python -m benchmarks.imports`
+"""
+
+import sys
+import types
+import importlib
+
+# seconds in a fresh interpreter (numpy included); see benchmarks/imports.py
+IMPORT_BUDGET = {
+    "utils": 0.05,
+    "utils.extract_and_download_data": 0.5,
+    "utils.analysis_utils": 0.5,
+    "utils.image_processing": 0.5,
+    "utils.plotting_utils": 0.5,
+}
+
+# wall time of `python -m utils --help`, interpreter start-up included
+CLI_BUDGET = 0.5
+
+# modules the lightweight entry points must not load at import time
+HEAVY_MODULES = ("jax", "scipy", "sklearn", "cv2", "matplotlib", "seaborn", "pandas", "requests",
+                 "numba")
+
+
+class _LazyModule(types.ModuleType):
+    """Placeholder that imports the real module when an attribute is first read."""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = self.__dict__["_module"] = importlib.import_module(self.__name__)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+
+def lazy_import(name):
+    """The module `name` if already imported, else a stand-in that imports it on use."""
+    module = sys.modules.get(name)
+    return module if module is not None else _LazyModule(name)
@@ -0,0 +1,55 @@
+# utils/moments.py
+"""
+moments.py
+
+Streaming moments shared by the spectral drivers and the parallel executor.
+It includes:
+  - `RunningStats`, a Welford/Chan accumulator of the mean, variance and
+    SEM of vectors, merged batch by batch in constant memory
+
+Only numpy is imported, so any module can use it without pulling in the
+image or plotting code.
+"""
+
+import numpy as np
+
+
+class RunningStats:
+    """
+    Streaming mean / SEM (ddof=1) of vectors, merged batch by batch.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Shape of one observation.
+    """
+
+    def __init__(self, shape):
+        self.n = 0
+        self.mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+
+    def update(self, batch):
+        """Add a batch of observations with shape (k, *shape)."""
+        batch = np.asarray(batch, dtype=float)
+        k = batch.shape[0]
+        if k == 0:
+            return
+        b_mean = batch.mean(axis=0)
+        b_m2 = ((batch - b_mean)**2).sum(axis=0)
+        n = self.n + k
+        delta = b_mean - self.mean
+        self.mean = self.mean + delta * (k / n)
+        self._m2 = self._m2 + b_m2 + delta**2 * (self.n * k / n)
+        self.n = n
+
+    def var(self, ddof=1):
+        if self.n <= ddof:
+            return np.full_like(self.mean, np.nan)
+        return self._m2 / (self.n - ddof)
+
+    @property
+    def sem(self):
+        if self.n < 2:
+            return np.full_like(self.mean, np.nan)
+        return np.sqrt(self._m2 / (self.n - 1)) / np.sqrt(self.n)
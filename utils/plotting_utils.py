@@ -1,11 +1,10 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from matplotlib.lines import Line2D
-from matplotlib.patches import PathPatch
-from matplotlib.path import Path as MplPath
-from matplotlib.legend_handler import HandlerPatch
-from scipy.stats import gaussian_kde
+
+from utils.lazy import lazy_import
+
+# matplotlib, seaborn and scipy load on first use, so `q_to_stars` stays cheap
+plt = lazy_import("matplotlib.pyplot")
+sns = lazy_import("seaborn")
 
 def q_to_stars(q):
     return "****" if q<1e-4 else "***" if q<1e-3 else "**" if q<1e-2 else "*" if q<.05 else ""
@@ -19,6 +18,8 @@ def clusters(vals, gap=2.):
     return out
 
 def gaussian_patch():
+    from matplotlib.patches import PathPatch
+    from matplotlib.path import Path as MplPath
     x = np.linspace(0,1,50)
     y = np.exp(-((x-.5)/.25)**2)
     verts = np.column_stack([x,y])
@@ -26,20 +27,37 @@ def gaussian_patch():
     path = MplPath(verts, codes)
     return PathPatch(path, lw=1.3, facecolor="none", edgecolor="black")
 
-class HandlerGaussian(HandlerPatch):
-    def create_artists(self, legend, tup, xdescent, ydescent, width, height, fontsize, trans_):
-        patch = gaussian_patch()
-        import matplotlib.transforms as transforms
-        patch.set_transform(trans_ +
-            transforms.Affine2D().scale(width, height*0.8).translate(xdescent, ydescent))
-        return [patch]
-
-VERT_HANDLE = Line2D([0],[0], ls="none", marker='|', ms=10, mec="black", mfc="black", mew=1.3)
-GAUSS_HANDLE = gaussian_patch()
+def _legend_handles():
+    from matplotlib.legend_handler import HandlerPatch
+    from matplotlib.lines import Line2D
+
+    class HandlerGaussian(HandlerPatch):
+        def create_artists(self, legend, tup, xdescent, ydescent, width, height, fontsize, trans_):
+            patch = gaussian_patch()
+            import matplotlib.transforms as transforms
+            patch.set_transform(trans_ +
+                transforms.Affine2D().scale(width, height*0.8).translate(xdescent, ydescent))
+            return [patch]
+    HandlerGaussian.__qualname__ = "HandlerGaussian"
+    HandlerGaussian.__module__ = __name__
+
+    return {
+        "HandlerGaussian": HandlerGaussian,
+        "VERT_HANDLE": Line2D([0],[0], ls="none", marker='|', ms=10, mec="black", mfc="black", mew=1.3),
+        "GAUSS_HANDLE": gaussian_patch(),
+    }
+
+def __getattr__(name):
+    # legend helpers are built (and matplotlib imported) on first access
+    if name in ("HandlerGaussian", "VERT_HANDLE", "GAUSS_HANDLE"):
+        globals().update(_legend_handles())
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def plot_rotated_density_single(ax, title, obs, perm, p_value,
                                 color=(0.8,0.8,0.8), line_color="firebrick"):
     """One‐sided rotated KDE for a single distribution + obs line."""
+    from scipy.stats import gaussian_kde
     kde = gaussian_kde(perm)
     # x-grid over central bulk
     lo, hi = np.percentile(perm, [0.1, 99.9])
@@ -80,6 +98,7 @@ def plot_rotated_density_dual(ax, title, obs_vals, perm_vals, colors, p_cat, p_p
     """Two‐sided KDE: perm_vals = [perm1, perm2], obs_vals = [obs1, obs2]."""
     perm1, perm2 = perm_vals
     obs1, obs2   = obs_vals
+    from scipy.stats import gaussian_kde
     kde1 = gaussian_kde(perm1)
     kde2 = gaussian_kde(perm2)
 
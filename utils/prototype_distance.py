@@ -0,0 +1,233 @@
+# utils/prototype_distance.py
+"""
+prototype_distance.py
+
+Distance to Prototype (DP) of high-variation images and its category-matched
+bootstrap null, for neural windows and DNN feature sets alike.
+It includes:
+  - truncated_pca: a randomized (or exact) 50-component projection,
+    computed once per feature set and reused by every statistic on it
+  - PrototypeDistance, which derives everything that depends only on the
+    metadata once (object segments and category pools), draws each
+    bootstrap index buffer in one pass, and then, per feature set,
+    computes all object prototypes and all image-to-prototype distances as
+    segmented reductions instead of a Python loop over objects
+
+Distances are mean squared Euclidean distances in PCA space (the former
+`sqeucl`). Prototypes are means of the low-variation exemplars of each
+object; the null of an object resamples, with replacement, as many
+high-variation images of other objects of its category as it has.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def truncated_pca(X, n_components=50, method="randomized", n_oversamples=10, n_iter=7, seed=0):
+    """
+    Mean and leading principal axes of X.
+
+    Parameters
+    ----------
+    X : ndarray, shape (n, d)
+    n_components : int, optional
+    method : {"randomized", "exact"}, optional
+        "randomized" uses a range finder with `n_iter` QR-normalized power
+        iterations (Halko et al.), "exact" a thin SVD of the centred data.
+    n_oversamples, n_iter, seed : int, optional
+        Randomized range-finder settings.
+
+    Returns
+    -------
+    mean : ndarray of float32, shape (d,)
+    comps : ndarray of float32, shape (n_components, d)
+    """
+    X = np.asarray(X, dtype=np.float32)
+    mean = X.mean(axis=0, dtype=np.float64).astype(np.float32)
+    Xc = X - mean
+    k = min(n_components, *Xc.shape)
+    if method == "exact":
+        _, _, Vt = np.linalg.svd(Xc, full_matrices=False)
+        return mean, Vt[:k]
+    if method != "randomized":
+        raise ValueError(f"Unknown method {method!r}")
+    rng = np.random.default_rng(seed)
+    width = min(k + n_oversamples, *Xc.shape)
+    Q, _ = np.linalg.qr(Xc @ rng.standard_normal((Xc.shape[1], width)).astype(np.float32))
+    for _ in range(n_iter):
+        Q, _ = np.linalg.qr(Xc.T @ Q)
+        Q, _ = np.linalg.qr(Xc @ Q)
+    _, _, Vt = np.linalg.svd(Q.T @ Xc, full_matrices=False)
+    return mean, Vt[:k]
+
+
+def project(X, n_components=50, method="randomized", **kwargs):
+    """(n, n_components) PCA scores of X (see `truncated_pca`)."""
+    mean, comps = truncated_pca(X, n_components, method, **kwargs)
+    return (np.asarray(X, dtype=np.float32) - mean) @ comps.T
+
+
+def _segment_starts(codes):
+    """Start offsets of runs in a sorted code array."""
+    return np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if codes.size else codes
+
+
+class PrototypeDistance:
+    """
+    DP engine shared by every window and network of one stimulus set.
+
+    Parameters
+    ----------
+    meta : DataFrame
+        Needs object_name, category_name and variation; rows follow the
+        rows of every feature matrix passed later.
+    n_perm : int, optional
+        Bootstrap resamples per object.
+    rng : np.random.Generator, optional
+        Draws the bootstrap index buffers. Each `dp` call draws a fresh
+        buffer from the continuing stream, objects in order with
+        `rng.integers(0, pool_size, (n_perm, n_hv))` as the former
+        per-object `rng.choice(pool_d, ...)` did, so successive `dp` calls
+        (and the feature sets of `run`, in order) reproduce the notebook's
+        successive `compute_dp_for_window(X, meta, rng)` calls.
+        `run(..., shared=True)` draws one buffer for all its feature sets.
+    """
+
+    def __init__(self, meta, n_perm=10_000, rng=None):
+        self.rng = np.random.default_rng() if rng is None else rng
+        var_col = meta["variation"].values
+        low_var = (var_col == 0) | (var_col == "background_only")
+        high_var = (var_col == 3) | (var_col == "full_variation") | (var_col == "full")
+        obj_all = meta["object_name"].values
+        cat_all = meta["category_name"].values
+
+        # objects with both low- and high-variation images, in first-appearance order
+        objects = [o for o in pd.unique(obj_all)
+                   if (low_var & (obj_all == o)).any() and (high_var & (obj_all == o)).any()]
+        code = pd.Series(np.arange(len(objects)), index=objects)
+        obj_code = code.reindex(obj_all).to_numpy(dtype=float)
+        obj_code = np.where(np.isnan(obj_code), -1, obj_code).astype(np.int64)
+        self.objects = objects
+        self.n_perm = n_perm
+
+        # prototype segments (low variation), sorted by object
+        lv = np.flatnonzero(low_var & (obj_code >= 0))
+        lv = lv[np.argsort(obj_code[lv], kind="stable")]
+        self._lv_rows, self._lv_starts = lv, _segment_starts(obj_code[lv])
+        self._lv_count = np.diff(np.r_[self._lv_starts, lv.size])
+
+        # every high-variation image (pool members), and each object's own ones
+        self.hv_rows = np.flatnonzero(high_var)
+        hv_code = obj_code[self.hv_rows]
+        own = np.flatnonzero(hv_code >= 0)
+        own = own[np.argsort(hv_code[own], kind="stable")]
+        n_obj = len(objects)
+        self._own_flat = own * n_obj + hv_code[own]          # into (n_hv, n_obj) distances
+        self._own_starts = _segment_starts(hv_code[own])
+        self._own_count = np.diff(np.r_[self._own_starts, own.size])
+        self._hv_code = hv_code
+
+        # category pools: per object, the other objects' high-variation images
+        hv_cat = cat_all[self.hv_rows]
+        hv_obj = obj_all[self.hv_rows]
+        first_lv = {o: cat_all[lv[s]] for o, s in zip(objects, self._lv_starts)}
+        self._pools = []
+        for o_code, o in enumerate(objects):
+            pool = np.flatnonzero((hv_cat == first_lv[o]) & (hv_obj != o))
+            if pool.size:
+                self._pools.append((o_code, pool))
+        with_pool = [o_code for o_code, _ in self._pools]
+        self._boot_count = self._own_count[with_pool] if with_pool else np.empty(0, int)
+        self._boot_starts = np.r_[0, np.cumsum(self._boot_count)[:-1]].astype(np.int64)[:len(with_pool)]
+        self._boot = None
+
+    def resample(self):
+        """
+        Draw a new (n_perm, n_draws) bootstrap buffer from `rng`: per object,
+        n_hv draws from its category pool. Returns the buffer.
+        """
+        n_obj = len(self.objects)
+        cols = [pool[self.rng.integers(0, pool.size, size=(self.n_perm, self._own_count[o_code]))]
+                * n_obj + o_code for o_code, pool in self._pools]
+        self._boot = (np.concatenate(cols, axis=1).astype(np.int32) if cols
+                      else np.empty((self.n_perm, 0), np.int32))
+        return self._boot
+
+    def prototypes(self, Z):
+        """(n_objects, k) mean low-variation scores of every object."""
+        Z = np.asarray(Z, dtype=np.float64)
+        sums = np.add.reduceat(Z[self._lv_rows], self._lv_starts, axis=0)
+        return sums / self._lv_count[:, None]
+
+    def distances(self, Z):
+        """
+        (n_hv, n_objects) mean squared distance of every high-variation image
+        (rows of `hv_rows`) to every object prototype.
+        """
+        Z = np.asarray(Z, dtype=np.float64)
+        H = Z[self.hv_rows]
+        P = self.prototypes(Z)
+        D = (H**2).sum(axis=1)[:, None] + (P**2).sum(axis=1)[None, :] - 2 * H @ P.T
+        return np.maximum(D, 0) / Z.shape[1]
+
+    def image_dp(self, Z):
+        """DP of every high-variation image to its own object's prototype (NaN if none)."""
+        D = self.distances(Z)
+        out = np.full(self.hv_rows.size, np.nan)
+        has = self._hv_code >= 0
+        out[has] = D[np.flatnonzero(has), self._hv_code[has]]
+        return out
+
+    def dp(self, Z, chunk=1000, resample=True):
+        """
+        Grand-mean DP and its bootstrap null for one projected feature set.
+
+        With `resample` (default) a fresh bootstrap buffer is drawn first;
+        otherwise the last one is reused.
+
+        Returns
+        -------
+        emp : float
+            Mean over objects of the per-object mean DP.
+        null : ndarray, shape (n_perm,)
+            Mean over objects (with a non-empty pool) of resampled pool DPs.
+        p : float
+            Fraction of the null at or below `emp`.
+        """
+        D = self.distances(Z).ravel()
+        if self._own_flat.size == 0:
+            return np.nan, np.full(self.n_perm, np.nan), np.nan
+        emp = float((np.add.reduceat(D[self._own_flat], self._own_starts) / self._own_count).mean())
+        if self._boot_starts.size == 0:
+            return emp, np.full(self.n_perm, np.nan), np.nan
+        if resample or self._boot is None:
+            self.resample()
+        null = np.empty(self.n_perm)
+        for s in range(0, self.n_perm, chunk):
+            vals = D[self._boot[s:s + chunk]]
+            means = np.add.reduceat(vals, self._boot_starts, axis=1) / self._boot_count
+            null[s:s + chunk] = means.mean(axis=1)
+        p = float((null <= emp).mean()) if np.isfinite(emp) else np.nan
+        return emp, null, p
+
+    def run(self, features, n_components=50, method="randomized", shared=False, **kwargs):
+        """
+        DP of several feature sets (windows, networks), one projection each.
+
+        Parameters
+        ----------
+        features : dict
+            Key -> (n_images, n_features) array, rows aligned with `meta`.
+        shared : bool, optional
+            Give every feature set the same resamples (one buffer drawn for
+            this call) instead of fresh ones per set, in key order.
+
+        Returns
+        -------
+        dict
+            Key -> (emp, null, p); see `dp`.
+        """
+        if shared:
+            self.resample()
+        return {key: self.dp(project(X, n_components, method, **kwargs), resample=not shared)
+                for key, X in features.items()}
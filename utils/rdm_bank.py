@@ -0,0 +1,186 @@
+# utils/rdm_bank.py
+"""
+rdm_bank.py
+
+Bank of precomputed condensed model RDMs over one fixed stimulus set.
+It includes:
+  - `condensed_rdm`, the full condensed Euclidean RDM of (n, d) features,
+    computed in row blocks from float64 Gram products and written straight
+    into a float32 memory map (no n x n matrix is held)
+  - `subset_positions`, the pdist positions of every pair of a stimulus
+    subset, so any subset's condensed RDM is one gather from the full one
+  - `RDMBank`, a directory of per-network RDMs with `subset`, `batches`
+    (one (n_batches, n_pairs) block per network for the RSA batch loops)
+    and `robust_rdm`, the median/MAD consensus of `analysis_utils.robust_rdm`
+    reduced over the stacked bank rows
+
+Layout on disk:
+    root/<key>.npy         condensed RDM, float32, (n * (n - 1) / 2,)
+    root/<key>.json        {"n", "names", "metric", "fingerprint", "source"}
+
+Distances are stored in float32, so subset RDMs match `pdist` to ~1e-7
+relative; ranks can differ from the float64 path only between near-ties.
+"""
+
+import os
+import json
+
+import numpy as np
+
+from utils.analysis_utils import get_upper_indices, robust_consensus
+
+
+def n_pairs(n):
+    return n * (n - 1) // 2
+
+
+def subset_positions(idx, n):
+    """
+    Positions in the condensed RDM of n stimuli of the pairs (idx[a], idx[b]),
+    a < b, in `pdist(X[idx])` order. Repeated stimuli get position -1.
+    """
+    idx = np.asarray(idx, dtype=np.int64)
+    a, b = get_upper_indices(idx.shape[-1])
+    i, j = idx[..., a], idx[..., b]
+    lo, hi = np.minimum(i, j), np.maximum(i, j)
+    pos = n * lo - lo * (lo + 1) // 2 + (hi - lo - 1)
+    return np.where(lo == hi, -1, pos)
+
+
+def condensed_rdm(X, out=None, block_bytes=64 * 2**20):
+    """
+    Condensed Euclidean RDM of the rows of `X`, as `pdist(X)` but in float32.
+
+    `out` may be a preallocated float32 array or memory map of n*(n-1)/2
+    entries; rows are processed in blocks of about `block_bytes`.
+    """
+    X = np.asarray(X)
+    n = X.shape[0]
+    if out is None:
+        out = np.empty(n_pairs(n), dtype=np.float32)
+    sq = np.einsum("ij,ij->i", X, X, dtype=np.float64)
+    rows = max(1, block_bytes // (8 * max(n, 1)))
+    for s in range(0, n - 1, rows):
+        e = min(s + rows, n - 1)
+        G = X[s:e].astype(np.float64) @ X[s:].T.astype(np.float64)      # (e - s, n - s)
+        D = sq[s:e, None] + sq[None, s:] - 2.0 * G
+        np.maximum(D, 0.0, out=D)
+        np.sqrt(D, out=D)
+        for r in range(s, e):
+            start = n * r - r * (r + 1) // 2
+            out[start:start + n - 1 - r] = D[r - s, r - s + 1:]
+    return out
+
+
+class RDMBank:
+    """
+    Directory of condensed RDMs, one per network, over a shared stimulus set.
+
+    Parameters
+    ----------
+    root : str
+        Bank directory; created if missing.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._open = {}
+
+    @property
+    def keys(self):
+        return sorted(f[:-5] for f in os.listdir(self.root) if f.endswith(".json"))
+
+    def __contains__(self, key):
+        return os.path.exists(os.path.join(self.root, f"{key}.json"))
+
+    def meta(self, key):
+        with open(os.path.join(self.root, f"{key}.json")) as f:
+            return json.load(f)
+
+    def build(self, key, X, names=None, fingerprint=None, source=None, force=False):
+        """
+        Compute and store the RDM of features `X` (n, d) under `key`.
+
+        Skipped when an entry with the same `fingerprint` exists (pass e.g.
+        the feature file's fingerprint); returns the key.
+        """
+        meta_path = os.path.join(self.root, f"{key}.json")
+        if not force and fingerprint is not None and os.path.exists(meta_path):
+            if self.meta(key).get("fingerprint") == fingerprint:
+                return key
+        X = np.asarray(X)
+        X = X.reshape(X.shape[0], -1)
+        n = X.shape[0]
+        if names is not None and len(names) != n:
+            raise ValueError(f"{key}: {len(names)} names for {n} rows")
+
+        tmp = os.path.join(self.root, f"{key}.tmp.npy")
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(n_pairs(n),))
+        condensed_rdm(X, out=out)
+        out.flush()
+        del out
+        os.replace(tmp, os.path.join(self.root, f"{key}.npy"))
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({"n": n, "names": None if names is None else [str(s) for s in names],
+                       "metric": "euclidean", "fingerprint": fingerprint, "source": source}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        self._open.pop(key, None)
+        return key
+
+    def build_from_store(self, store, keys=None, names=None, force=False):
+        """
+        Build RDMs from a `FeatureStore` (all its keys by default), with rows
+        aligned to `names` when given. Returns the bank keys.
+        """
+        built = []
+        for key in (store.keys if keys is None else keys):
+            fa = store.open(key)
+            X = fa.array if names is None else fa.take(names)
+            with open(os.path.join(store.root, f"{key}.json")) as f:
+                fp = json.load(f).get("fingerprint")
+            fp = [fp, None if names is None else list(map(str, names))]
+            built.append(self.build(key, X, names=fa.names if names is None else names,
+                                    fingerprint=fp, source=key, force=force))
+        return built
+
+    def open(self, key):
+        """Memory-mapped condensed RDM of `key`."""
+        if key not in self._open:
+            self._open[key] = np.load(os.path.join(self.root, f"{key}.npy"), mmap_mode="r")
+        return self._open[key]
+
+    def n(self, key):
+        m = self.open(key).shape[0]
+        return int(round((1 + np.sqrt(1 + 8 * m)) / 2))
+
+    def subset(self, key, idx):
+        """Condensed RDM of the stimuli `idx` (same order as `pdist(X[idx])`)."""
+        D = self.open(key)
+        pos = subset_positions(idx, self.n(key))
+        out = np.zeros(pos.shape, dtype=np.float32)
+        valid = pos >= 0
+        p = pos[valid]
+        order = np.argsort(p, kind="stable")
+        vals = np.empty(p.shape, dtype=np.float32)
+        vals[order] = D[p[order]]                   # sorted reads are page-friendly
+        out[valid] = vals
+        return out
+
+    def batches(self, key, batch_idx):
+        """(n_batches, n_pairs) condensed RDMs of each row of `batch_idx`."""
+        return self.subset(key, np.asarray(batch_idx))
+
+    def stack(self, keys=None, idx=None):
+        """(n_keys, n_pairs) float32 rows of the full RDMs or of one subset."""
+        keys = self.keys if keys is None else list(keys)
+        if idx is None:
+            return np.stack([np.asarray(self.open(k)) for k in keys])
+        return np.stack([self.subset(k, idx) for k in keys])
+
+    def robust_rdm(self, keys=None, idx=None):
+        """
+        Median/MAD consensus of `keys` over the stimuli `idx` (default all):
+        `analysis_utils.robust_rdm` without recomputing any distance.
+        """
+        return robust_consensus(self.stack(keys, idx))
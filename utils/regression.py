@@ -0,0 +1,189 @@
+# utils/regression.py
+"""
+regression.py
+
+Leave-one-category-out position regression (PCA + linear regression) and
+its category-stratified circular-error null.
+It includes:
+  - loco_pca_regression: PCA(n_components) + OLS predictions for every
+    held-out group, with all targets solved together. One eigendecomposition
+    per training split is taken from a kernel computed once per feature set
+    (the sample Gram matrix when features outnumber trials, the feature
+    covariance otherwise), so X is never re-centred or re-projected per split
+  - predict_angles: (cos, sin) targets -> predicted angles for one or
+    several feature sets (time windows, networks)
+  - circ_diff and circular_mae_null, which evaluates the MAE of many
+    stratified shuffles as array operations (see
+    stats.stratified_permutations)
+"""
+
+import numpy as np
+from scipy.linalg import eigh
+
+from utils.stats import stratified_permutations
+
+
+def _top_eigh(M, k, solver="auto", n_iter=7, n_oversamples=10, seed=42):
+    """
+    Largest `k` eigenpairs of a symmetric PSD matrix, numerically-null ones dropped.
+
+    solver="exact" uses a truncated LAPACK eigh; "randomized" a seeded
+    subspace iteration (Halko et al.), O(n^2 k) per iteration instead of
+    O(n^3); "auto" picks randomized above 1000 x 1000, like sklearn's PCA.
+    """
+    n = M.shape[0]
+    k = min(k, n)
+    if solver == "auto":
+        solver = "randomized" if n > 1000 and k + n_oversamples < n else "exact"
+    if solver == "exact":
+        w, v = eigh(M, subset_by_index=[n - k, n - 1])
+    elif solver == "randomized":
+        rng = np.random.default_rng(seed)
+        Q, _ = np.linalg.qr(M @ rng.standard_normal((n, min(k + n_oversamples, n))))
+        for _ in range(n_iter):
+            Q, _ = np.linalg.qr(M @ Q)
+        w, vb = np.linalg.eigh(Q.T @ M @ Q)
+        w, v = w[-k:], Q @ vb[:, -k:]
+    else:
+        raise ValueError(f"Unknown solver {solver!r}")
+    w, v = w[::-1], v[:, ::-1]
+    keep = w > w[0] * n * np.finfo(float).eps if w.size and w[0] > 0 else np.zeros(w.size, bool)
+    return w[keep], v[:, keep]
+
+
+def loco_pca_regression(X, Y, groups, n_components=50, solver="auto"):
+    """
+    Leave-one-group-out predictions of PCA(n_components) + LinearRegression.
+
+    For every group, PCA and the regression are fitted on the other groups
+    and the held-out rows are predicted, as in the notebooks'
+    `for cat in categories` loops.
+
+    Parameters
+    ----------
+    X : ndarray, shape (n, d)
+    Y : ndarray, shape (n,) or (n, k)
+        Targets; all columns share the decomposition of each split.
+    groups : ndarray, shape (n,)
+        Group (category) label of every row.
+    n_components : int, optional
+    solver : {"auto", "exact", "randomized"}, optional
+        Eigensolver of each split's kernel; "auto" is exact up to
+        1000 x 1000 kernels and randomized above (see `_top_eigh`).
+
+    Returns
+    -------
+    pred : ndarray, shape of `Y`
+    """
+    X = np.asarray(X, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    squeeze = Y.ndim == 1
+    if squeeze:
+        Y = Y[:, None]
+    groups = np.asarray(groups)
+    n, d = X.shape
+    pred = np.zeros_like(Y)
+
+    if d >= n:
+        # sample space: centred train Gram and centred test/train cross-Gram
+        K = X @ X.T
+        for g in np.unique(groups):
+            te = groups == g
+            tr = ~te
+            Ktt = K[np.ix_(tr, tr)]
+            m = Ktt.mean(axis=0)
+            mm = m.mean()
+            w, U = _top_eigh(Ktt - m[:, None] - m[None, :] + mm, n_components, solver)
+            Kx = K[np.ix_(te, tr)]
+            Kx = Kx - Kx.mean(axis=1, keepdims=True) - m[None, :] + mm
+            y_mean = Y[tr].mean(axis=0)
+            pred[te] = (Kx @ (U / w)) @ (U.T @ (Y[tr] - y_mean)) + y_mean
+    else:
+        # feature space: train covariance from the full second moments
+        G = X.T @ X
+        XY = X.T @ Y
+        sx, sy = X.sum(axis=0), Y.sum(axis=0)
+        for g in np.unique(groups):
+            te = groups == g
+            Xte, Yte = X[te], Y[te]
+            n_tr = n - Xte.shape[0]
+            mu = (sx - Xte.sum(axis=0)) / n_tr
+            y_mean = (sy - Yte.sum(axis=0)) / n_tr
+            C = G - Xte.T @ Xte - n_tr * np.outer(mu, mu)
+            w, V = _top_eigh(C, n_components, solver)
+            cross = XY - Xte.T @ Yte - n_tr * np.outer(mu, y_mean)
+            pred[te] = (Xte - mu) @ (V / w) @ (V.T @ cross) + y_mean
+    return pred[:, 0] if squeeze else pred
+
+
+def predict_angles(features, angles, groups, n_components=50, solver="auto"):
+    """
+    Leave-one-category-out angle predictions from (cos, sin) regression.
+
+    Parameters
+    ----------
+    features : ndarray (n, d), or dict of key -> ndarray
+        One feature set, or several (e.g. {"early": ..., "late": ...} or
+        one entry per network).
+    angles : ndarray, shape (n,)
+        True angles in radians.
+    groups : ndarray, shape (n,)
+        Category label of every row.
+
+    Returns
+    -------
+    ndarray, shape (n,), or dict of key -> ndarray
+        Predicted angles (radians), arctan2 of the predicted (sin, cos).
+    """
+    Y = np.column_stack((np.cos(angles), np.sin(angles)))
+    if isinstance(features, dict):
+        return {key: predict_angles(X, angles, groups, n_components, solver)
+                for key, X in features.items()}
+    pred = loco_pca_regression(features, Y, groups, n_components, solver)
+    return np.arctan2(pred[:, 1], pred[:, 0])
+
+
+def circ_diff(a, b):
+    return np.arctan2(np.sin(a - b), np.cos(a - b))
+
+
+def circular_mae_null(pred_angle, true_angle, groups, n_perm=10_000, rng=None, chunk=1000,
+                      legacy=False):
+    """
+    Null distribution of the circular MAE under category-stratified shuffles
+    of `true_angle`.
+
+    Parameters
+    ----------
+    pred_angle : ndarray, shape (n,) or (m, n)
+        Predicted angles; several rows (e.g. early/late) share the shuffles.
+    true_angle : ndarray, shape (n,)
+    groups : ndarray, shape (n,)
+    n_perm : int, optional
+    rng : np.random.Generator, optional
+    chunk : int, optional
+        Permutations evaluated per block.
+    legacy : bool, optional
+        Draw the shuffles so that, with the same seed, they equal the
+        notebooks' loop over `_cat_to_idx` (see stats.stratified_permutations).
+
+    Returns
+    -------
+    ndarray, shape (n_perm,) or (m, n_perm)
+    """
+    pred_angle = np.asarray(pred_angle, dtype=np.float64)
+    true_angle = np.asarray(true_angle, dtype=np.float64)
+    squeeze = pred_angle.ndim == 1
+    pred = np.atleast_2d(pred_angle)
+    # |wrapped a - b| = atan2(|sin(a - b)|, cos(a - b)); the sines and cosines
+    # are taken once and only gathered per shuffle
+    sp, cp = np.sin(pred)[:, None, :], np.cos(pred)[:, None, :]
+    st, ct = np.sin(true_angle), np.cos(true_angle)
+    null = np.empty((pred.shape[0], n_perm))
+    start = 0
+    for idx in stratified_permutations(groups, n_perm, rng, chunk, legacy=legacy):
+        s_b, c_b = st[idx][None], ct[idx][None]                            # (1, c, n)
+        err = np.arctan2(np.abs(sp * c_b - cp * s_b), cp * c_b + sp * s_b)  # (m, c, n)
+        null[:, start:start + idx.shape[0]] = err.mean(axis=-1)
+        start += idx.shape[0]
+    return null[0] if squeeze else null
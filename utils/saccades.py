@@ -0,0 +1,283 @@
+# utils/saccades.py
+"""
+saccades.py
+
+Saccade events detected by U'n'Eye, stored as a compact columnar table.
+It includes:
+  - Onset/offset detection for all trials at once from the (n_trials,
+    n_time) label matrix, returned as integer arrays
+  - Vectorized start/end median positions and peak velocities
+  - A structured-array event table (one row per saccade, with the columns
+    of the former df_saccades frame) saved as .npy and reopened memory-mapped
+    instead of to_pickle/read_pickle
+  - Per-stimulus x per-bin circular mean directions from `bincount` over
+    unit vectors, with NaN cells backfilled by the per-bin circular mean
+    in one step, and the odd/even direction-locking metric and its null
+
+Times in the table are in seconds relative to stimulus onset; start/end
+are sample indices of the eye trace.
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+SAMPLING_RATE = 250          # Hz, eye_pos_250
+ONSET = 0.3                  # s of signal before stimulus onset
+
+SACCADE_DTYPE = np.dtype([
+    ("Trial", np.int32),
+    ("stimId", np.int32),
+    ("start", np.int32),
+    ("end", np.int32),
+    ("Start_Time", np.float64),
+    ("Stop_Time", np.float64),
+    ("Duration", np.float64),
+    ("Start_X", np.float32),
+    ("Start_Y", np.float32),
+    ("Stop_X", np.float32),
+    ("Stop_Y", np.float32),
+    ("Amplitude", np.float32),
+    ("Peak_Velocity", np.float32),
+    ("Time_of_Peak_Velocity", np.float64),
+    ("polar_angle", np.float64),
+])
+
+
+def calculate_velocity(X, Y, dt=1):
+    """Speed from position traces (n_trials, n_time); the last sample is repeated."""
+    Vx = np.diff(X, axis=1, append=X[:, -1:]) / dt
+    Vy = np.diff(Y, axis=1, append=Y[:, -1:]) / dt
+    return np.sqrt(Vx**2 + Vy**2)
+
+
+def find_saccades(L):
+    """
+    Start and end sample of every labelled saccade.
+
+    Parameters
+    ----------
+    L : ndarray, shape (n_trials, n_time)
+        Binary saccade labels (U'n'Eye `model.predict`).
+
+    Returns
+    -------
+    trials, starts, ends : ndarray of int64
+        One entry per saccade, ordered by trial then start. A saccade
+        still running at the end of the trace ends at n_time - 1.
+    """
+    n_trials, n_time = L.shape
+    diffL = np.diff(L.astype(np.int8), axis=1, prepend=0)
+    start_rows, start_cols = np.nonzero(diffL == 1)
+    end_rows, end_cols = np.nonzero(diffL == -1)
+    # row-major nonzero order makes trial * n_time + col sorted
+    start_keys = start_rows.astype(np.int64) * n_time + start_cols
+    end_keys = end_rows.astype(np.int64) * n_time + end_cols
+    pos = np.searchsorted(end_keys, start_keys, side="right")
+    ends = np.full(start_keys.shape, n_time - 1, dtype=np.int64)
+    found = pos < end_keys.size
+    found[found] = end_rows[pos[found]] == start_rows[found]
+    ends[found] = end_cols[pos[found]]
+    return start_rows.astype(np.int64), start_cols.astype(np.int64), ends
+
+
+def _windows(n_time, times, offset):
+    """Index matrix and validity mask of [t + offset[0], t + offset[1]) clipped to the trace."""
+    lo = np.maximum(times + offset[0], 0)
+    hi = np.minimum(times + offset[1], n_time)
+    idx = (times + offset[0])[:, None] + np.arange(offset[1] - offset[0])[None, :]
+    valid = (idx >= lo[:, None]) & (idx < hi[:, None])
+    return np.clip(idx, 0, n_time - 1), valid
+
+
+def median_position(X, Y, trials, times, offset):
+    """
+    Median (x, y) in the window [t + offset[0], t + offset[1]) of every event.
+
+    Returns an (n_events, 2) array (NaN for empty windows).
+    """
+    trials, times = np.asarray(trials, dtype=np.int64), np.asarray(times, dtype=np.int64)
+    idx, valid = _windows(X.shape[1], times, offset)
+    out = np.full((trials.size, 2), np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)      # all-NaN (empty) windows
+        for k, S in enumerate((X, Y)):
+            vals = np.where(valid, S[trials[:, None], idx], np.nan)
+            out[:, k] = np.nanmedian(vals, axis=1)
+    return out
+
+
+def saccade_table(L, X, Y, stim_ids=None, fs=SAMPLING_RATE, onset=ONSET, time_window=(0.0, 0.2),
+                  start_offset=(-10, 0), end_offset=(0, 10)):
+    """
+    Event table of all saccades, replacing the per-saccade dict loop.
+
+    Parameters
+    ----------
+    L : ndarray, shape (n_trials, n_time)
+        Saccade labels.
+    X, Y : ndarray, shape (n_trials, n_time)
+        Eye position traces (deg).
+    stim_ids : ndarray, shape (n_trials,), optional
+        Stimulus of every trial (indexed by trial_index_global); -1 if omitted.
+    fs : float, optional
+        Sampling rate of the traces (Hz).
+    onset : float, optional
+        Time of stimulus onset from the start of the trace (s).
+    time_window : (float, float) or None, optional
+        Keep saccades with Start_Time <= time_window[1] and
+        Stop_Time >= time_window[0]; None keeps all.
+    start_offset, end_offset : (int, int), optional
+        Sample windows around start/end for the median positions.
+
+    Returns
+    -------
+    table : structured ndarray of SACCADE_DTYPE
+    """
+    trials, starts, ends = find_saccades(L)
+    start_pos = median_position(X, Y, trials, starts, start_offset)
+    end_pos = median_position(X, Y, trials, ends, end_offset)
+
+    velocity = calculate_velocity(X, Y)
+    dur = ends - starts
+    width = max(int(dur.max()) if dur.size else 0, 1)
+    idx = starts[:, None] + np.arange(width)[None, :]
+    inside = idx < ends[:, None]
+    v = np.where(inside, velocity[trials[:, None], np.minimum(idx, velocity.shape[1] - 1)], -np.inf)
+    peak_time = starts + np.argmax(v, axis=1)
+
+    delta = end_pos - start_pos
+    table = np.zeros(trials.size, dtype=SACCADE_DTYPE)
+    table["Trial"] = trials
+    table["stimId"] = -1 if stim_ids is None else np.asarray(stim_ids)[trials]
+    table["start"] = starts
+    table["end"] = ends
+    table["Start_Time"] = starts / fs - onset
+    table["Stop_Time"] = ends / fs - onset
+    table["Duration"] = dur / fs
+    table["Start_X"], table["Start_Y"] = start_pos[:, 0], start_pos[:, 1]
+    table["Stop_X"], table["Stop_Y"] = end_pos[:, 0], end_pos[:, 1]
+    table["Amplitude"] = np.sqrt(np.sum(delta**2, axis=1))
+    table["Peak_Velocity"] = velocity[trials, peak_time] / fs
+    table["Time_of_Peak_Velocity"] = (peak_time - starts) / fs
+    table["polar_angle"] = np.arctan2(delta[:, 1], delta[:, 0])
+    if time_window is not None:
+        keep = (table["Start_Time"] <= time_window[1]) & (table["Stop_Time"] >= time_window[0])
+        table = table[keep]
+    return table
+
+
+def save_table(table, path):
+    """Save an event table as .npy (binary, memory-mappable)."""
+    np.save(path, np.ascontiguousarray(table, dtype=SACCADE_DTYPE))
+
+
+def load_table(path, mmap=True):
+    """Load a saved event table; memory-mapped unless `mmap` is False."""
+    return np.load(path, mmap_mode="r" if mmap else None)
+
+
+def to_frame(table):
+    """Event table as a DataFrame with the columns of the former df_saccades."""
+    return pd.DataFrame(np.asarray(table))
+
+
+def from_frame(df, fs=SAMPLING_RATE, onset=ONSET):
+    """
+    Event table from an existing df_saccades frame (e.g. a legacy .pkl).
+
+    Missing stimIds (unmatched merges) become -1; start/end samples are
+    recovered from Start_Time/Stop_Time when absent.
+    """
+    table = np.zeros(len(df), dtype=SACCADE_DTYPE)
+    table["stimId"] = -1
+    for name in SACCADE_DTYPE.names:
+        if name in df.columns:
+            col = df[name]
+            if SACCADE_DTYPE[name].kind == "i":
+                col = col.fillna(-1)
+            table[name] = col.to_numpy()
+    for name, time in (("start", "Start_Time"), ("end", "Stop_Time")):
+        if name not in df.columns and time in df.columns:
+            table[name] = np.rint((df[time].to_numpy() + onset) * fs)
+    return table
+
+
+def circular_bin_means(table, n_stim, bin_edges, fill=True):
+    """
+    Circular mean saccade direction per stimulus and time bin.
+
+    A saccade falls in bin b when bin_edges[b] < Start_Time < bin_edges[b+1].
+    Directions are averaged as unit vectors summed with `bincount`.
+
+    Parameters
+    ----------
+    table : structured ndarray or DataFrame
+        Needs stimId, Start_Time and polar_angle.
+    n_stim : int
+    bin_edges : ndarray, shape (n_bins + 1,)
+        Increasing edges (s).
+    fill : bool, optional
+        Replace empty cells by the circular mean of the bin's non-empty
+        cells (0.0 for bins without any saccade).
+
+    Returns
+    -------
+    mean_dir : ndarray, shape (n_stim, n_bins)
+        Radians, NaN for empty cells when `fill` is False.
+    """
+    stim = np.asarray(table["stimId"]).astype(np.int64)
+    t = np.asarray(table["Start_Time"], dtype=np.float64)
+    a = np.asarray(table["polar_angle"], dtype=np.float64)
+    edges = np.asarray(bin_edges, dtype=np.float64)
+    n_bins = edges.size - 1
+
+    b = np.searchsorted(edges, t, side="left") - 1           # edges[b] < t <= edges[b+1]
+    ok = (b >= 0) & (b < n_bins) & (stim >= 0) & (stim < n_stim)
+    ok[ok] &= t[ok] < edges[b[ok] + 1]                       # strict upper edge
+    cell = stim[ok] * n_bins + b[ok]
+    size = n_stim * n_bins
+    count = np.bincount(cell, minlength=size).reshape(n_stim, n_bins)
+    c = np.bincount(cell, weights=np.cos(a[ok]), minlength=size).reshape(n_stim, n_bins)
+    s = np.bincount(cell, weights=np.sin(a[ok]), minlength=size).reshape(n_stim, n_bins)
+    mean_dir = np.where(count > 0, np.arctan2(s, c), np.nan)
+    if fill:
+        mean_dir = fill_circular(mean_dir)
+    return mean_dir
+
+
+def fill_circular(mean_dir):
+    """Backfill NaN cells of (n_stim, n_bins) directions with each bin's circular mean."""
+    have = ~np.isnan(mean_dir)
+    d = np.where(have, mean_dir, 0.0)
+    fill = np.arctan2((np.sin(d) * have).sum(axis=0), (np.cos(d) * have).sum(axis=0))
+    fill[~have.any(axis=0)] = 0.0
+    return np.where(have, mean_dir, fill[None, :])
+
+
+def direction_locking(mean_dir_odd, mean_dir_even):
+    """Per-bin locking |(v_odd + v_even) / 2| averaged over stimuli."""
+    v = (np.exp(1j * mean_dir_odd) + np.exp(1j * mean_dir_even)) / 2.0
+    return np.abs(v).mean(axis=0)
+
+
+def direction_locking_null(mean_dir_odd, mean_dir_even, n_perm, rng=None, chunk=250):
+    """
+    Null of `direction_locking` with even stimuli re-paired at random.
+
+    The row permutations equal `rng.permutation(n_stim)` drawn once per
+    iteration, so a seeded rng reproduces the notebook's loop.
+
+    Returns an (n_perm, n_bins) array.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    v_odd = np.exp(1j * np.asarray(mean_dir_odd))
+    v_even = np.exp(1j * np.asarray(mean_dir_even))
+    n_stim = v_odd.shape[0]
+    null = np.empty((n_perm, v_odd.shape[1]))
+    for start in range(0, n_perm, chunk):
+        c = min(chunk, n_perm - start)
+        idx = rng.permuted(np.tile(np.arange(n_stim), (c, 1)), axis=1)
+        null[start:start + c] = np.abs((v_odd[None] + v_even[idx]) / 2.0).mean(axis=1)
+    return null
@@ -0,0 +1,251 @@
+# utils/session_store.py
+"""
+session_store.py
+
+Appendable, memory-mapped store for the aggregated trial data produced by
+the preprocessing notebook.
+It includes:
+  - A SessionStore holding one chunked array per signal (spike counts,
+    eye position, pupil, ...), with one .npy chunk per recording session
+  - A columnar trial index (stimId, time_of_stimulus) per session
+  - Fingerprints of the source files so unchanged sessions are skipped
+  - Readers that return zero-copy memory-mapped views per session and
+    gathered selections by session, stimulus or time bins
+  - append_aligned_session, the incremental counterpart of the
+    aggregation cell (aggregated_*.npy + recording_metadata.csv)
+
+Layout on disk:
+    root/manifest.json
+    root/signals/<signal>/<session>.npy
+    root/index/<session>.npz
+"""
+
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+MANIFEST = "manifest.json"
+
+
+def file_fingerprint(paths):
+    """(size, mtime_ns) of each file; a session is re-appended when this changes."""
+    return [[os.path.getsize(p), os.stat(p).st_mtime_ns] for p in paths]
+
+
+def _atomic_save(path, arr):
+    tmp = f"{path}.tmp.npy"
+    np.save(tmp, arr)
+    os.replace(tmp, path)
+
+
+class SessionStore:
+    """
+    Chunked per-signal arrays with a session/trial index.
+
+    Parameters
+    ----------
+    root : str
+        Directory of the store; created if missing.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, "signals"), exist_ok=True)
+        os.makedirs(os.path.join(root, "index"), exist_ok=True)
+        path = os.path.join(root, MANIFEST)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"sessions": [], "signals": {}}
+        self._index = None
+
+    # ------------------------------------------------------------------
+    # writing
+    # ------------------------------------------------------------------
+    def _write_manifest(self):
+        path = os.path.join(self.root, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(path + ".tmp", path)
+        self._index = None
+
+    def _session_entry(self, name):
+        for entry in self.manifest["sessions"]:
+            if entry["name"] == name:
+                return entry
+        return None
+
+    def is_current(self, name, fingerprint):
+        """True if `name` is stored with the same source fingerprint."""
+        entry = self._session_entry(name)
+        return entry is not None and entry["fingerprint"] == fingerprint
+
+    def append_session(self, name, signals, trial_columns, fingerprint=None):
+        """
+        Add or replace one session.
+
+        Parameters
+        ----------
+        name : str
+            Session name (e.g. the recording date / .mat basename).
+        signals : dict of str -> ndarray
+            Per-trial arrays with a common first dimension (n_trials, ...).
+        trial_columns : dict of str -> ndarray
+            1-D per-trial index columns (e.g. stimId, time_of_stimulus).
+        fingerprint : list, optional
+            Source fingerprint (see `file_fingerprint`).
+
+        Returns
+        -------
+        appended : bool
+            False when the session is already stored with this fingerprint.
+        """
+        if fingerprint is not None and self.is_current(name, fingerprint):
+            return False
+        n_trials = {len(v) for v in signals.values()} | {len(v) for v in trial_columns.values()}
+        if len(n_trials) != 1:
+            raise ValueError(f"Session {name}: signals and index columns disagree on n_trials")
+        for sig, arr in signals.items():
+            arr = np.asarray(arr)
+            spec = self.manifest["signals"].setdefault(
+                sig, {"dtype": arr.dtype.str, "trailing_shape": list(arr.shape[1:])})
+            if list(arr.shape[1:]) != spec["trailing_shape"]:
+                raise ValueError(f"Signal {sig}: trailing shape {arr.shape[1:]} != {spec['trailing_shape']}")
+            os.makedirs(os.path.join(self.root, "signals", sig), exist_ok=True)
+            _atomic_save(self._chunk_path(sig, name), arr.astype(spec["dtype"], copy=False))
+        tmp = os.path.join(self.root, "index", f"{name}.tmp.npz")
+        np.savez(tmp, **{k: np.asarray(v) for k, v in trial_columns.items()})
+        os.replace(tmp, os.path.join(self.root, "index", f"{name}.npz"))
+
+        entry = {"name": name, "n_trials": n_trials.pop(), "fingerprint": fingerprint,
+                 "signals": sorted(signals)}
+        self.manifest["sessions"] = [e for e in self.manifest["sessions"] if e["name"] != name]
+        self.manifest["sessions"].append(entry)
+        self.manifest["sessions"].sort(key=lambda e: e["name"])
+        self._write_manifest()
+        return True
+
+    # ------------------------------------------------------------------
+    # reading
+    # ------------------------------------------------------------------
+    def _chunk_path(self, signal, session):
+        return os.path.join(self.root, "signals", signal, f"{session}.npy")
+
+    @property
+    def sessions(self):
+        return [e["name"] for e in self.manifest["sessions"]]
+
+    @property
+    def signals(self):
+        return sorted(self.manifest["signals"])
+
+    def open(self, signal, session):
+        """Zero-copy memory-mapped (n_trials, ...) view of one session."""
+        return np.load(self._chunk_path(signal, session), mmap_mode="r")
+
+    def trial_index(self):
+        """
+        Columnar trial table across sessions, in store order.
+
+        Columns: trial_index_global, recording_date, session, row (row within
+        the session chunk) and every stored index column.
+        """
+        if self._index is None:
+            frames = []
+            for s, entry in enumerate(self.manifest["sessions"]):
+                with np.load(os.path.join(self.root, "index", f"{entry['name']}.npz")) as z:
+                    cols = {k: z[k] for k in z.files}
+                cols["recording_date"] = np.full(entry["n_trials"], entry["name"], dtype=object)
+                cols["session"] = np.full(entry["n_trials"], s, dtype=np.int32)
+                cols["row"] = np.arange(entry["n_trials"])
+                frames.append(pd.DataFrame(cols))
+            index = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+                columns=["recording_date", "session", "row"])
+            index.insert(0, "trial_index_global", np.arange(len(index)))
+            self._index = index
+        return self._index
+
+    def select(self, signal, sessions=None, stim_ids=None, bins=None, bin_axis=-1):
+        """
+        Gather trials of `signal` by session and/or stimulus, optionally
+        restricted to a time-bin slice/index along `bin_axis`.
+
+        Only the selected rows are read from the memory-mapped chunks.
+        Returns (data, trials) where `trials` is the matching slice of
+        `trial_index()`.
+        """
+        index = self.trial_index()
+        keep = np.ones(len(index), dtype=bool)
+        if sessions is not None:
+            keep &= index["recording_date"].isin(np.atleast_1d(sessions)).to_numpy()
+        if stim_ids is not None:
+            keep &= index["stimId"].isin(np.atleast_1d(stim_ids)).to_numpy()
+        trials = index[keep]
+        spec = self.manifest["signals"][signal]
+        parts = []
+        for name, rows in trials.groupby("recording_date", sort=False)["row"]:
+            chunk = self.open(signal, name)
+            if bins is not None:
+                sl = [slice(None)] * chunk.ndim
+                sl[bin_axis] = bins
+                chunk = chunk[tuple(sl)]
+            parts.append(np.asarray(chunk[rows.to_numpy()]))
+        if not parts:
+            empty = np.empty((0, *spec["trailing_shape"]), dtype=spec["dtype"])
+            if bins is not None:
+                sl = [slice(None)] * empty.ndim
+                sl[bin_axis] = bins
+                empty = empty[tuple(sl)]
+            return empty, trials
+        return np.concatenate(parts, axis=0), trials
+
+    def concatenate(self, signal):
+        """All sessions of `signal` as one in-memory array (aggregated_*.npy)."""
+        return np.concatenate([self.open(signal, s) for s in self.sessions], axis=0)
+
+
+def append_aligned_session(store, mat_file, aligned_dir="aligned_data"):
+    """
+    Append the process_file outputs of one .mat session to `store`.
+
+    Mirrors the aggregation cell of the preprocessing notebook (int8 spike
+    counts, 100 Hz eye position/pupil over 0–200 ms, 250 Hz eye position)
+    and skips the session when neither the .mat nor its aligned outputs
+    changed since the last append.
+
+    Returns True if the session was (re)written.
+    """
+    from scipy.io import loadmat
+
+    base = os.path.splitext(os.path.basename(mat_file))[0]
+    spike_file, eye_file, pupil_file = [
+        os.path.join(aligned_dir, f"{base}_{suffix}.npy")
+        for suffix in ("stim_aligned_count", "eye_pos", "pupil_aligned")
+    ]
+    sources = [mat_file, spike_file, eye_file, pupil_file]
+    if not all(os.path.exists(p) for p in sources):
+        print(f"Skipping file {base}: required files not found.")
+        return False
+    fingerprint = file_fingerprint(sources)
+    if store.is_current(base, fingerprint):
+        return False
+
+    mat_data = loadmat(mat_file, variable_names=["stimId", "stimTime"])
+    eye_pos = np.load(eye_file, mmap_mode="r")
+    pupil_aligned = np.load(pupil_file, mmap_mode="r")
+    spikes = np.load(spike_file, mmap_mode="r")
+    n_trials = spikes.shape[0]
+    columns = {
+        "stimId": mat_data["stimId"][0] if "stimId" in mat_data else np.full(n_trials, -1),
+        "time_of_stimulus": mat_data["stimTime"][0] if "stimTime" in mat_data else np.full(n_trials, np.nan),
+    }
+    signals = {
+        "spike_counts": spikes.astype(np.int8),
+        "eye_pos": eye_pos[:, ::20][:, 30:50].astype(np.float32),      # 2 kHz → 100 Hz, 0–200 ms
+        "pupil": pupil_aligned[:, ::20].astype(np.float32),            # 2 kHz → 100 Hz
+        "eye_pos_250": eye_pos[:, ::8].astype(np.float32),             # 2 kHz → 250 Hz
+    }
+    return store.append_session(base, signals, columns, fingerprint)
@@ -0,0 +1,192 @@
+# utils/spectral.py
+"""
+spectral.py
+
+Single-pass spectral statistics for stimulus sets.
+It includes:
+  - A precomputed radial-bin index for the real-FFT (rfft2) layout, cached
+    per image shape and reused across images
+  - Streaming mean and SEM through `utils.moments.RunningStats`
+    (Welford/Chan), so memory stays constant however many images are
+    processed
+  - A filter bank that derives the radial spectra (and optionally the
+    filtered images) for many `cutoff_cpd` values from one forward FFT
+    per image
+  - Folder-level drivers used by image_processing.compute_radial_spectra
+
+Radial averages over the rfft2 half-plane are weighted by each column's
+multiplicity in the full spectrum, so they equal the fftshift-based
+radial_average_vectorized of image_processing.
+"""
+
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from utils.image_processing import gaussian_transfer_function, to_uint8, _list_images
+from utils.moments import RunningStats
+from utils.lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+
+RadialBins = namedtuple("RadialBins", ["index", "weights", "count", "cpd", "n_bins"])
+
+
+@lru_cache(maxsize=16)
+def radial_bins(shape, visual_angle=8):
+    """
+    Radial-bin index of the rfft2 layout of a (rows, cols) image.
+
+    Returns
+    -------
+    RadialBins
+        index   : flat integer radius of every rfft2 coefficient
+        weights : multiplicity of each coefficient in the full spectrum
+        count   : weighted number of coefficients per radius
+        cpd     : spatial-frequency axis (cycles per degree)
+        n_bins  : number of radii
+    """
+    rows, cols = shape
+    v = np.fft.ifftshift(np.arange(rows) - rows // 2)    # integer fftfreq(rows) * rows
+    u = np.arange(cols // 2 + 1)                          # integer rfftfreq(cols) * cols
+    r = np.sqrt(u[None, :]**2 + v[:, None]**2).astype(int)
+    w = np.full(u.size, 2.0)
+    w[0] = 1.0
+    if cols % 2 == 0:
+        w[-1] = 1.0           # Nyquist column has no mirror in rfft2
+    weights = np.broadcast_to(w, r.shape).ravel()
+    index = r.ravel()
+    n_bins = int(index.max()) + 1
+    count = np.bincount(index, weights=weights, minlength=n_bins)
+    count[count == 0] = 1     # avoid division by zero
+    cpd = np.linspace(0, (rows // 2) / visual_angle, n_bins)
+    for a in (index, weights, count, cpd):
+        a.flags.writeable = False
+    return RadialBins(index, weights, count, cpd, n_bins)
+
+
+def radial_average(magnitude, bins):
+    """
+    Radial average of rfft2 magnitudes.
+
+    magnitude : (..., rows, cols // 2 + 1) magnitudes.
+    Returns (..., n_bins).
+    """
+    lead = magnitude.shape[:-2]
+    flat = magnitude.reshape(-1, bins.index.size) * bins.weights
+    m = flat.shape[0]
+    labels = (bins.index[None, :] + bins.n_bins * np.arange(m)[:, None]).ravel()
+    sums = np.bincount(labels, weights=flat.ravel(), minlength=m * bins.n_bins)
+    return (sums.reshape(m, bins.n_bins) / bins.count).reshape(*lead, bins.n_bins)
+
+
+def log_radial_spectrum(images, visual_angle=8, epsilon=1e-8):
+    """Log radial magnitude spectrum of an image or (..., rows, cols) stack."""
+    images = np.asarray(images, dtype=np.float32)
+    bins = radial_bins(tuple(images.shape[-2:]), visual_angle)
+    return np.log(radial_average(np.abs(np.fft.rfft2(images)), bins) + epsilon)
+
+
+def filter_bank(image, cutoffs_cpd, fov_deg=8.0, atten_dB_at_cut=-20, visual_angle=8,
+                epsilon=1e-8, return_images=True):
+    """
+    Low-pass an image at several cutoffs from one forward FFT.
+
+    Parameters
+    ----------
+    image : ndarray, shape (rows, cols)
+    cutoffs_cpd : sequence of float
+        Cutoffs (cycles/degree) of the Gaussian low-pass of
+        image_processing.m_pathway_filter_gaussian.
+    return_images : bool, optional
+        Also inverse-transform the filtered images.
+
+    Returns
+    -------
+    log_orig : ndarray, shape (n_bins,)
+    log_filt : ndarray, shape (n_cutoffs, n_bins)
+        Log radial spectra of the original and of each filtered image.
+    filtered : ndarray of float32, shape (n_cutoffs, rows, cols) or None
+    """
+    image = np.asarray(image, dtype=np.float32)
+    shape = tuple(image.shape)
+    bins = radial_bins(shape, visual_angle)
+    F = np.fft.rfft2(image)
+    H = np.stack([gaussian_transfer_function(shape, c, fov_deg, atten_dB_at_cut)
+                  for c in cutoffs_cpd])
+    mag = np.abs(F)
+    log_orig = np.log(radial_average(mag, bins) + epsilon)
+    log_filt = np.log(radial_average(mag[None] * H, bins) + epsilon)
+    filtered = np.fft.irfft2(F[None] * H, s=shape).astype(np.float32) if return_images else None
+    return log_orig, log_filt, filtered
+
+
+def folder_radial_spectra(stimulus_folder, output_folder, visual_angle=8, epsilon=1e-8):
+    """
+    Streaming mean/SEM of log radial spectra of original and filtered images.
+
+    Same inputs and outputs as image_processing.compute_radial_spectra:
+    (cpd, mean_orig, sem_orig, mean_filt, sem_filt).
+    """
+    orig = filt = None
+    cpd = None
+    for img_name in _list_images(stimulus_folder):
+        original_img = cv2.imread(os.path.join(stimulus_folder, img_name), cv2.IMREAD_GRAYSCALE)
+        filtered_img = cv2.imread(os.path.join(output_folder, img_name), cv2.IMREAD_GRAYSCALE)
+        if original_img is None or filtered_img is None:
+            continue
+        spectra = log_radial_spectrum(np.stack([original_img, filtered_img]), visual_angle, epsilon)
+        if orig is None:
+            orig, filt = RunningStats(spectra.shape[1:]), RunningStats(spectra.shape[1:])
+            cpd = radial_bins(tuple(original_img.shape), visual_angle).cpd
+        orig.update(spectra[:1])
+        filt.update(spectra[1:])
+    if orig is None:
+        return None, np.array([]), np.array([]), np.array([]), np.array([])
+    return cpd, orig.mean, orig.sem, filt.mean, filt.sem
+
+
+def cutoff_sweep(stimulus_folder, cutoffs_cpd, output_folders=None, fov_deg=8.0,
+                 atten_dB_at_cut=-20, visual_angle=8, epsilon=1e-8):
+    """
+    Radial spectra of a whole stimulus folder for many cutoffs at once.
+
+    Every image is decoded and transformed once; filtered spectra come
+    from the filter bank. When `output_folders` (one per cutoff) is given,
+    the filtered images are also written as uint8.
+
+    Returns
+    -------
+    cpd : ndarray, shape (n_bins,)
+    mean_orig, sem_orig : ndarray, shape (n_bins,)
+    mean_filt, sem_filt : ndarray, shape (n_cutoffs, n_bins)
+    """
+    cutoffs_cpd = list(cutoffs_cpd)
+    if output_folders is not None:
+        if len(output_folders) != len(cutoffs_cpd):
+            raise ValueError("output_folders needs one folder per cutoff")
+        for folder in output_folders:
+            os.makedirs(folder, exist_ok=True)
+    orig = filt = None
+    cpd = None
+    for img_name in _list_images(stimulus_folder):
+        img = cv2.imread(os.path.join(stimulus_folder, img_name), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            continue
+        log_orig, log_filt, filtered = filter_bank(
+            img, cutoffs_cpd, fov_deg, atten_dB_at_cut, visual_angle, epsilon,
+            return_images=output_folders is not None)
+        if orig is None:
+            orig, filt = RunningStats(log_orig.shape), RunningStats(log_filt.shape)
+            cpd = radial_bins(tuple(img.shape), visual_angle).cpd
+        orig.update(log_orig[None])
+        filt.update(log_filt[None])
+        if output_folders is not None:
+            for folder, out in zip(output_folders, filtered):
+                cv2.imwrite(os.path.join(folder, img_name), to_uint8(out))
+    if orig is None:
+        empty = np.array([])
+        return None, empty, empty, empty, empty
+    return cpd, orig.mean, orig.sem, filt.mean, filt.sem